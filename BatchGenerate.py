@@ -0,0 +1,107 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+from GeneratorClient import generate_seeded_floor, generate_package, profile_seeded_package
+from BranchingGeneratorAsClass import LOG_QUIET
+from Profiling import MODES
+
+ROOM_SET_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "RoomSets", "A2_RoomSet.json")
+CHUNK_SIZE: int = 4 # Seeds handed to a worker process at once
+
+# Parses a seed range "start:end" (end exclusive) or a single seed
+def parse_seed_range(text: str) -> range:
+    if ":" in text:
+        start, end = text.split(":", 1)
+        return range(int(start), int(end))
+    return range(int(text), int(text) + 1)
+
+# Parses a comma separated list of item ids
+def parse_inventory(text: str) -> list:
+    return [int(item) for item in text.split(",") if item.strip() != ""]
+
+# Generates the floor for one seed exactly like GeneratorClient does and returns (seed, package, attempts, seconds).
+# Runs in the worker processes, the generator's output is thrown away
+def generate_for_seed(task: tuple) -> tuple:
+    seed, width, height, number_of_keys, start_inventory = task
+    start_time = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        generator, attempts = generate_seeded_floor(seed, width, height, number_of_keys, start_inventory, ROOM_SET_PATH, log_level=LOG_QUIET)
+        package = generate_package(generator, number_of_keys)
+    return seed, package, attempts, time.perf_counter() - start_time
+
+# Same as generate_for_seed, but under the profiler. Runs in this process
+def profile_for_seed(task: tuple, mode: str, directory: str) -> tuple:
+    seed, width, height, number_of_keys, start_inventory = task
+    start_time = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        package, stats = profile_seeded_package(mode, directory, seed, width, height, number_of_keys, start_inventory, ROOM_SET_PATH, LOG_QUIET)
+    return seed, package, stats["rerolls"] + 1, time.perf_counter() - start_time
+
+# Generates a package for every seed, on a pool of worker processes if workers > 1. Yields the results in seed order.
+# With a profile mode every seed is profiled on its own in this process and the profiles are written to profile_directory
+def generate_batch(seeds: range, width: int, height: int, number_of_keys: int, start_inventory: list, workers: int,
+                   profile_mode: str = None, profile_directory: str = None):
+    tasks = ((seed, width, height, number_of_keys, start_inventory) for seed in seeds)
+    if profile_mode is not None:
+        yield from (profile_for_seed(task, profile_mode, profile_directory) for task in tasks)
+        return
+    if workers <= 1:
+        yield from map(generate_for_seed, tasks)
+        return
+    with Pool(workers) as pool:
+        yield from pool.imap(generate_for_seed, tasks, CHUNK_SIZE)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates the floors for a range of seeds without the game")
+    parser.add_argument("width", type=int, help="Width of the floors, at most 74")
+    parser.add_argument("height", type=int, help="Height of the floors, at most 57")
+    parser.add_argument("keys", type=int, help="Number of boss keys to place")
+    parser.add_argument("seeds", type=parse_seed_range, help="Seed range start:end (end exclusive) or a single seed")
+    parser.add_argument("--inventory", type=parse_inventory, default=[], help="Comma separated item ids of the start inventory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes, 1 generates in this process")
+    parser.add_argument("--profile", choices=MODES, help="Profile every seed on its own in this process, see Profiling.py")
+    parser.add_argument("--profile-dir", default="Profiles", help="Directory for the profiles and their seed and parameter files")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--out-dir", help="Write one <seed>.json package file per seed into this directory")
+    output.add_argument("--jsonl", help="Write all packages as one JSON line {\"Seed\": ..., \"Package\": ...} per seed, - for stdout")
+    args = parser.parse_args()
+
+    width = min(74, abs(args.width))
+    height = min(57, abs(args.height))
+    if args.out_dir is not None:
+        os.makedirs(args.out_dir, exist_ok=True)
+        stream = None
+    elif args.jsonl == "-":
+        stream = sys.stdout
+    else:
+        stream = open(args.jsonl, "w")
+    # Keep the report away from the packages when they go to stdout
+    report = sys.stderr if stream is sys.stdout else sys.stdout
+
+    start_time = time.perf_counter()
+    floors = 0
+    attempts = 0
+    workers = 1 if args.profile is not None else args.workers
+    for seed, package, seed_attempts, _ in generate_batch(args.seeds, width, height, args.keys, args.inventory, workers,
+                                                          args.profile, args.profile_dir):
+        floors += 1
+        attempts += seed_attempts
+        if stream is None:
+            with open(os.path.join(args.out_dir, f"{seed}.json"), "w") as file:
+                json.dump(package, file)
+        else:
+            stream.write(json.dumps({"Seed": seed, "Package": package}) + "\n")
+    elapsed = time.perf_counter() - start_time
+    if stream is not None and stream is not sys.stdout:
+        stream.close()
+
+    print(f"Generated {floors} floors ({width}x{height}, {args.keys} keys) in {elapsed:.2f}s with {workers} workers", file=report)
+    if floors > 0:
+        print(f"{floors / elapsed:.1f} floors per second", file=report)
+        print(f"Success rate: {floors / attempts * 100:.1f}% ({attempts} attempts, {attempts - floors} rerolled)", file=report)
+    if args.profile is not None:
+        print(f"Wrote {args.profile} profiles to {args.profile_dir}", file=report)
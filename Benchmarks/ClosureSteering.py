@@ -0,0 +1,49 @@
+# Compares generating with and without closure steering, rerolling failed floors the same way GeneratorClient does.
+# Usage: python Benchmarks/ClosureSteering.py [seeds] [width] [height] [keys]
+import collections
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BranchingGeneratorAsClass import FloorGenerator
+
+ROOM_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RoomSets", "A2_RoomSet.json")
+
+def run_seed(seed: int, width: int, height: int, keys: int, closure_steering: bool, result: dict) -> None:
+    rng = random.Random(seed)
+    start_time = time.perf_counter()
+    success = False
+    while not success:
+        result["attempts"] += 1
+        generator = FloorGenerator(width, height, ROOM_SET_PATH, [], rng=rng, closure_steering=closure_steering)
+        with contextlib.redirect_stdout(io.StringIO()):
+            success = generator.generate_floor(keys)
+        result["backtracks"] += generator.stats.backtracks
+        result["dead end fallbacks"] += generator.stats.dead_end_fallbacks
+        if not success:
+            result["failures"][generator.failure_reason] += 1
+    result["seconds"] += time.perf_counter() - start_time
+
+if __name__ == "__main__":
+    seeds = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+    keys = int(sys.argv[4]) if len(sys.argv) > 4 else int(round(width/4 - 1))
+
+    results = {steering: {"attempts": 0, "backtracks": 0, "dead end fallbacks": 0, "seconds": 0.0, "failures": collections.Counter()}
+               for steering in (False, True)}
+    # Alternate between both settings so that noise on the machine hits them alike
+    for current_seed in range(seeds):
+        for steering in (False, True):
+            run_seed(current_seed, width, height, keys, steering, results[steering])
+
+    print(f"{width}x{height} with {keys} keys, {seeds} seeds")
+    print(f"{'steering':>9} {'ms/success':>11} {'attempts':>9} {'backtracks':>11} {'fallbacks':>10}  failures")
+    for steering, result in results.items():
+        failures = ", ".join(f"{reason}: {count}" for reason, count in result["failures"].most_common())
+        print(f"{'on' if steering else 'off':>9} {result['seconds'] / seeds * 1000:11.2f} {result['attempts'] / seeds:9.3f} "
+              f"{result['backtracks'] / seeds:11.3f} {result['dead end fallbacks'] / seeds:10.2f}  {failures}")
@@ -0,0 +1,94 @@
+# Compares the shared single pass exporter against the per cell export loop that GeneratorClient.generate_package and the
+# __main__ of BranchingGeneratorAsClass used before, on full size maps. Checks that both give the same MapData and tiles.
+# Usage: python Benchmarks/Export.py [seeds] [width] [height]
+import contextlib
+import io
+import os
+import sys
+import time
+from copy import deepcopy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BranchingGeneratorAsClass import LOG_QUIET
+from Exporter import export_map, START
+from GeneratorClient import generate_seeded_floor
+
+ROOM_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RoomSets", "A2_RoomSet.json")
+REPEATS: int = 20
+PROTOTYPE_TILE: dict = {"color": 0, "corner": 0, "isCorner": False, "special": 0, "wallD": 1, "wallL": 1, "wallU": 1, "wallR": 1, "x": 0, "y": 0}
+
+# The old export loop: list lookups for items and teleporters and, for the tiles, a deepcopy per tile
+def reference_export(gen, tiles: list = None) -> list:
+    map_init_strings = [gen.width, gen.height]
+    teleporter_coords = list(gen.teleporter_transitions.keys()) + list(gen.teleporter_transitions.values())
+    grid = gen.grid
+    for position in grid:
+        if grid[position] != None:
+            tile = grid[position]
+            map_string = f"{tile.u}{tile.r}{tile.d}{tile.l}1"
+            new_tile = deepcopy(PROTOTYPE_TILE) if tiles is not None else {}
+            new_tile["wallL"] = tile.l
+            new_tile["wallU"] = tile.u
+            new_tile["wallD"] = tile.d
+            new_tile["wallR"] = tile.r
+            new_tile["x"] = position[0] + START[0]
+            new_tile["y"] = position[1] + START[1]
+            if position == gen.start_pos:
+                new_tile["special"] = 1
+                map_string += "1"
+            elif position in gen.tiles_with_items:
+                new_tile["special"] = 3
+                map_string += "3"
+            elif position in teleporter_coords:
+                new_tile["color"] = 1
+                new_tile["special"] = 7
+                map_string = f"{tile.u}{tile.r}{tile.d}{tile.l}27"
+            elif position == gen.boss_tile:
+                new_tile["special"] = 4
+                new_tile["color"] = 3
+                map_string = f"{tile.u}{tile.r}{tile.d}{tile.l}44"
+            else:
+                map_string += "0"
+            map_string += "0"
+            if tiles is not None:
+                tiles.append(new_tile)
+            map_init_strings.append(map_string)
+        else:
+            map_init_strings.append("0")
+    return map_init_strings
+
+# Returns the fastest time of REPEATS calls of export(gen, tiles) in seconds, with the MapData and tiles of the last call
+def fastest(export, gen, with_tiles: bool) -> tuple:
+    best = None
+    for _ in range(REPEATS):
+        tiles = [] if with_tiles else None
+        start_time = time.perf_counter()
+        map_data = export(gen, tiles)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best, map_data, tiles
+
+if __name__ == "__main__":
+    seeds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 74
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 57
+    keys = int(round(width/4 - 1))
+    totals = {(name, with_tiles): 0.0 for name in ("reference", "exporter") for with_tiles in (False, True)}
+    for seed in range(seeds):
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator, _ = generate_seeded_floor(seed, width, height, keys, [], ROOM_SET_PATH, LOG_QUIET)
+        for with_tiles in (False, True):
+            reference_time, reference_map, reference_tiles = fastest(reference_export, generator, with_tiles)
+            exporter_time, exporter_map, exporter_tiles = fastest(export_map, generator, with_tiles)
+            if reference_map != exporter_map or reference_tiles != exporter_tiles:
+                print(f"Seed {seed} exports differently")
+                sys.exit(1)
+            totals[("reference", with_tiles)] += reference_time
+            totals[("exporter", with_tiles)] += exporter_time
+
+    print(f"{width}x{height} with {keys} keys, {seeds} seeds, fastest of {REPEATS} runs, ms per floor")
+    print(f"{'':>10} {'MapData':>9} {'+ tiles':>9}")
+    for name in ("reference", "exporter"):
+        print(f"{name:>10} {totals[(name, False)] / seeds * 1000:9.3f} {totals[(name, True)] / seeds * 1000:9.3f}")
+    print(f"Speedup: {totals[('reference', False)] / totals[('exporter', False)]:.1f}x MapData, "
+          f"{totals[('reference', True)] / totals[('exporter', True)]:.1f}x with tiles")
@@ -0,0 +1,57 @@
+# Compares how floors grow with the different frontier orderings.
+# Usage: python Benchmarks/FrontierOrdering.py [seeds per ordering] [width] [height]
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BranchingGeneratorAsClass import FloorGenerator
+from Frontier import ORDERINGS
+
+ROOM_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RoomSets", "A2_RoomSet.json")
+
+def run_ordering(ordering: str, seeds: int, width: int, height: int) -> dict:
+    keys = int(round(width/4 - 1))
+    successes = 0
+    total_time = 0.0
+    iterations = 0
+    peak_frontier = 0
+    rooms = 0
+    filled_cells = 0
+    duplicates = 0
+    for current_seed in range(seeds):
+        rng = random.Random(current_seed)
+        generator = FloorGenerator(width, height, ROOM_SET_PATH, [], ordering, rng=rng)
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            successes += int(generator.generate_floor(keys))
+        total_time += time.perf_counter() - start_time
+        iterations += generator.stats.frontier_iterations
+        peak_frontier += generator.stats.peak_frontier_size
+        duplicates += generator.stats.duplicate_frontier_targets
+        rooms += generator.layout_id
+        filled_cells += sum(1 for cell in generator.grid.walls if cell != 0xFF)
+    return {
+        "ordering": ordering,
+        "success rate": successes / seeds,
+        "ms per floor": total_time / seeds * 1000,
+        "iterations": iterations / seeds,
+        "peak frontier": peak_frontier / seeds,
+        "duplicates dropped": duplicates / seeds,
+        "rooms": rooms / seeds,
+        "filled": filled_cells / seeds / (width * height)
+    }
+
+if __name__ == "__main__":
+    seeds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 74
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 57
+    print(f"{width}x{height}, {seeds} seeds per ordering")
+    print(f"{'ordering':>14} {'success':>8} {'ms/floor':>9} {'iters':>8} {'peak':>6} {'dupes':>6} {'rooms':>7} {'filled':>7}")
+    for ordering in ORDERINGS:
+        result = run_ordering(ordering, seeds, width, height)
+        print(f"{result['ordering']:>14} {result['success rate']*100:7.1f}% {result['ms per floor']:9.1f} {result['iterations']:8.1f} "
+              f"{result['peak frontier']:6.1f} {result['duplicates dropped']:6.1f} {result['rooms']:7.1f} {result['filled']*100:6.1f}%")
@@ -0,0 +1,55 @@
+# Compares the JSON and the compact binary form of the package: payload size, encode time and decode time.
+# Usage: python Benchmarks/PackageEncoding.py [seeds] [width] [height]
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BranchingGeneratorAsClass import LOG_QUIET
+from GeneratorClient import generate_seeded_package
+from PackageEncoding import encode_package, decode_package
+
+ROOM_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RoomSets", "A2_RoomSet.json")
+REPEATS: int = 20
+
+# Returns the fastest time of REPEATS calls of function(argument) in seconds and its result
+def fastest(function, argument) -> tuple:
+    best = None
+    for _ in range(REPEATS):
+        start_time = time.perf_counter()
+        result = function(argument)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+if __name__ == "__main__":
+    seeds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 74
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 57
+    keys = int(round(width/4 - 1))
+    totals = {"json size": 0, "json encode": 0.0, "json decode": 0.0, "binary size": 0, "binary encode": 0.0, "binary decode": 0.0}
+    for seed in range(seeds):
+        with contextlib.redirect_stdout(io.StringIO()):
+            package, _ = generate_seeded_package(seed, width, height, keys, [], ROOM_SET_PATH, LOG_QUIET)
+        encode_time, json_bytes = fastest(lambda p: json.dumps(p).encode(), package)
+        decode_time, _ = fastest(lambda b: json.loads(b), json_bytes)
+        totals["json size"] += len(json_bytes)
+        totals["json encode"] += encode_time
+        totals["json decode"] += decode_time
+        encode_time, binary = fastest(encode_package, package)
+        decode_time, decoded = fastest(decode_package, binary)
+        if decoded != json.loads(json_bytes):
+            print(f"Seed {seed} doesn't round-trip")
+            sys.exit(1)
+        totals["binary size"] += len(binary)
+        totals["binary encode"] += encode_time
+        totals["binary decode"] += decode_time
+
+    print(f"{width}x{height} with {keys} keys, {seeds} seeds, fastest of {REPEATS} runs")
+    print(f"{'':>7} {'bytes':>9} {'encode ms':>10} {'decode ms':>10}")
+    for form in ("json", "binary"):
+        print(f"{form:>7} {totals[form + ' size'] / seeds:9.0f} {totals[form + ' encode'] / seeds * 1000:10.3f} {totals[form + ' decode'] / seeds * 1000:10.3f}")
+    print(f"binary is {totals['binary size'] / totals['json size'] * 100:.1f}% of the JSON size")
@@ -0,0 +1,54 @@
+# Reports how often the placement memo answers a placement check on full size maps and compares the generation time with and
+# without the memo. Floors are the same either way, the memo only skips checks whose result it already knows.
+# Every seed is generated REPEATS times each way and the fastest time counts.
+# Usage: python Benchmarks/PlacementMemo.py [seeds] [width] [height] [memo size]
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import BranchingGeneratorAsClass
+from BranchingGeneratorAsClass import FloorGenerator, LOG_QUIET
+
+ROOM_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RoomSets", "A2_RoomSet.json")
+REPEATS: int = 3
+DEFAULT_MEMO_SIZE: int = 16384 # Used if PLACEMENT_MEMO_SIZE turns the memo off
+
+# Generates a seed REPEATS times with and without the memo, alternating so that both see the same load on the machine. Returns the
+# fastest time without and with the memo in seconds and the memo's counters
+def run_seed(seed: int, width: int, height: int, memo_size: int) -> tuple:
+    fastest = {0: None, memo_size: None}
+    for _ in range(REPEATS):
+        for size in fastest:
+            BranchingGeneratorAsClass.PLACEMENT_MEMO_SIZE = size
+            generator = FloorGenerator(width, height, ROOM_SET_PATH, [], rng=random.Random(seed), log_level=LOG_QUIET)
+            start_time = time.perf_counter()
+            generator.generate_floor(int(round(width/4 - 1)))
+            elapsed = time.perf_counter() - start_time
+            fastest[size] = elapsed if fastest[size] is None else min(fastest[size], elapsed)
+    memo = generator.placement_memo
+    return fastest[0], fastest[memo_size], memo.hits, memo.misses, memo.evictions
+
+if __name__ == "__main__":
+    seeds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 74
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 57
+    memo_size = int(sys.argv[4]) if len(sys.argv) > 4 else (BranchingGeneratorAsClass.PLACEMENT_MEMO_SIZE or DEFAULT_MEMO_SIZE)
+    if memo_size < 1:
+        print(f"Memo size must be at least 1, got {memo_size}")
+        sys.exit(1)
+    without_memo = with_memo = 0.0
+    hits = misses = evictions = 0
+    for seed in range(seeds):
+        results = run_seed(seed, width, height, memo_size)
+        without_memo += results[0]
+        with_memo += results[1]
+        hits += results[2]
+        misses += results[3]
+        evictions += results[4]
+    lookups = hits + misses
+    print(f"{width}x{height}, {seeds} seeds, rooms with up to {BranchingGeneratorAsClass.PLACEMENT_MEMO_MAX_TILES} tiles, memo size {memo_size}")
+    print(f"{lookups / seeds:.0f} lookups per floor, hit rate {hits / lookups * 100 if lookups > 0 else 0:.1f}%, {evictions / seeds:.0f} evictions per floor")
+    print(f"Without memo: {without_memo / seeds * 1000:.1f}ms per floor")
+    print(f"With memo:    {with_memo / seeds * 1000:.1f}ms per floor ({(without_memo / with_memo - 1) * 100:+.1f}%)")
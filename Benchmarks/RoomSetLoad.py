@@ -0,0 +1,44 @@
+# Compares the time it takes to load a room set from json with loading it from the compiled cache.
+# Usage: python Benchmarks/RoomSetLoad.py [room set path] [repetitions]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import RoomSet
+from RoomSet import load_room_set, load_room_set_json, read_compiled, compiled_path, hash_source
+
+def time_call(function, repetitions: int) -> float:
+    start_time = time.perf_counter()
+    for _ in range(repetitions):
+        function()
+    return (time.perf_counter() - start_time) / repetitions
+
+if __name__ == "__main__":
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    room_set_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(root, "RoomSets", "A2_RoomSet.json")
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    # Make sure the compiled file exists before measuring
+    load_room_set(room_set_path)
+    with open(room_set_path, "rb") as file:
+        source_hash = hash_source(file.read())
+    cache_path = compiled_path(room_set_path, source_hash)
+
+    def load_compiled():
+        read_compiled(cache_path, source_hash)
+
+    def load_uncached_process():
+        RoomSet._loaded_room_sets.clear()
+        load_room_set(room_set_path)
+
+    json_time = time_call(lambda: load_room_set_json(room_set_path), repetitions)
+    compiled_time = time_call(load_compiled, repetitions)
+    cold_time = time_call(load_uncached_process, repetitions)
+    warm_time = time_call(lambda: load_room_set(room_set_path), repetitions)
+
+    print(f"Room set: {room_set_path} ({repetitions} repetitions)")
+    print(f"json load:                  {json_time*1000:8.3f} ms")
+    print(f"compiled file load:         {compiled_time*1000:8.3f} ms")
+    print(f"load_room_set, new process: {cold_time*1000:8.3f} ms (hash check + compiled file)")
+    print(f"load_room_set, same process:{warm_time*1000:8.3f} ms")
@@ -0,0 +1,132 @@
+# Benchmark suite for floor generation. Generates a fixed set of seeds for every combination of map size, key count and start
+# inventory below and reports floors per second, time to success percentiles, rerolls per success and peak memory per case.
+# The results are written as JSON and can be compared against a stored baseline, which fails the run if a case got slower
+# than the threshold allows. Baselines are only comparable on the machine they were recorded on.
+# Timings on a busy machine are noisy, --repeat generates every seed several times and keeps the fastest time.
+# Usage: python Benchmarks/Suite.py [--seeds N] [--repeat N] [--out results.json] [--save-baseline] [--compare] [--baseline path] [--threshold 0.25]
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BranchingGeneratorAsClass import LOG_QUIET
+from GeneratorClient import generate_seeded_floor
+
+ROOM_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RoomSets", "A2_RoomSet.json")
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SIZES: list = [(12, 10), (20, 15), (40, 30), (74, 57)]
+INVENTORIES: dict = {
+    "empty": [],
+    "late": [450, 454, 456, 457, 458, 925, 926, 927]
+}
+MEMORY_SEEDS: int = 3 # Seeds per case that are generated again under tracemalloc to measure peak memory
+# Metrics where a higher value is worse, compared against the baseline
+TIME_METRICS: tuple = ("p50_ms", "p95_ms", "p99_ms")
+
+# Key counts of a map size: none, the count __main__ uses and twice that
+def key_counts(width: int) -> list:
+    default_keys = int(round(width/4 - 1))
+    return sorted(set([0, default_keys, 2 * default_keys]))
+
+def cases() -> list:
+    return [(width, height, keys, inventory_name) for width, height in SIZES for keys in key_counts(width) for inventory_name in INVENTORIES]
+
+def case_name(width: int, height: int, keys: int, inventory_name: str) -> str:
+    return f"{width}x{height}/{keys}keys/{inventory_name}"
+
+# Nearest rank percentile of sorted values
+def percentile(sorted_values: list, percent: float) -> float:
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(percent * len(sorted_values) / 100) - 1))
+    return sorted_values[rank]
+
+def run_case(width: int, height: int, keys: int, inventory: list, seeds: int, repeat: int) -> dict:
+    times = []
+    rerolls = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for seed in range(seeds):
+            fastest = None
+            for _ in range(repeat):
+                start_time = time.perf_counter()
+                _, attempts = generate_seeded_floor(seed, width, height, keys, inventory, ROOM_SET_PATH, log_level=LOG_QUIET)
+                elapsed = time.perf_counter() - start_time
+                fastest = elapsed if fastest is None else min(fastest, elapsed)
+            times.append(fastest)
+            rerolls += attempts - 1
+        peak_memory = 0
+        for seed in range(min(seeds, MEMORY_SEEDS)):
+            tracemalloc.start()
+            generate_seeded_floor(seed, width, height, keys, inventory, ROOM_SET_PATH, log_level=LOG_QUIET)
+            peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    times.sort()
+    return {
+        "seeds": seeds,
+        "floors_per_second": seeds / sum(times),
+        "p50_ms": percentile(times, 50) * 1000,
+        "p95_ms": percentile(times, 95) * 1000,
+        "p99_ms": percentile(times, 99) * 1000,
+        "rerolls_per_success": rerolls / seeds,
+        "peak_memory_kib": peak_memory / 1024
+    }
+
+# Returns a list of messages for every case and time metric that is more than threshold slower than in the baseline
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, result in results["cases"].items():
+        if not name in baseline["cases"]:
+            continue
+        for metric in TIME_METRICS:
+            old = baseline["cases"][name][metric]
+            new = result[metric]
+            if old > 0 and new > old * (1 + threshold):
+                regressions.append(f"{name} {metric}: {old:.2f} -> {new:.2f} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks floor generation over map sizes, key counts and start inventories")
+    parser.add_argument("--seeds", type=int, default=20, help="Seeds per case, always 0 to N-1")
+    parser.add_argument("--repeat", type=int, default=1, help="Generate every seed this often and keep the fastest time")
+    parser.add_argument("--out", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Baseline file for --save-baseline and --compare")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare against the baseline and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown of a time metric against the baseline, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seeds": args.seeds,
+        "repeat": args.repeat,
+        "cases": {}
+    }
+    print(f"{'case':>28} {'floors/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rerolls':>8} {'peak KiB':>9}")
+    for width, height, keys, inventory_name in cases():
+        name = case_name(width, height, keys, inventory_name)
+        result = run_case(width, height, keys, INVENTORIES[inventory_name], args.seeds, args.repeat)
+        results["cases"][name] = result
+        print(f"{name:>28} {result['floors_per_second']:9.1f} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} {result['p99_ms']:8.2f} "
+              f"{result['rerolls_per_success']:8.3f} {result['peak_memory_kib']:9.0f}")
+
+    if args.out is not None:
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    if args.compare:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        print(f"{len(regressions)} regressions against {args.baseline} with a threshold of {args.threshold * 100:.0f}%")
+        sys.exit(1 if regressions else 0)
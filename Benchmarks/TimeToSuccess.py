@@ -0,0 +1,46 @@
+# Measures the mean time until a successful floor, rerolling failed floors the same way GeneratorClient does.
+# Usage: python Benchmarks/TimeToSuccess.py [seeds] [width] [height] [keys]
+import collections
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BranchingGeneratorAsClass import FloorGenerator
+
+ROOM_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RoomSets", "A2_RoomSet.json")
+
+if __name__ == "__main__":
+    seeds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    keys = int(sys.argv[4]) if len(sys.argv) > 4 else int(round(width/4 - 1))
+
+    failure_reasons = collections.Counter()
+    attempts = 0
+    total_time = 0.0
+    failed_time = 0.0
+    for current_seed in range(seeds):
+        rng = random.Random(current_seed)
+        start_time = time.perf_counter()
+        success = False
+        while not success:
+            attempts += 1
+            attempt_start = time.perf_counter()
+            generator = FloorGenerator(width, height, ROOM_SET_PATH, [], rng=rng)
+            with contextlib.redirect_stdout(io.StringIO()):
+                success = generator.generate_floor(keys)
+            if not success:
+                failure_reasons[generator.failure_reason] += 1
+                failed_time += time.perf_counter() - attempt_start
+        total_time += time.perf_counter() - start_time
+
+    print(f"{width}x{height} with {keys} keys, {seeds} seeds")
+    print(f"mean time to success: {total_time / seeds * 1000:.2f} ms")
+    print(f"attempts per success: {attempts / seeds:.3f}")
+    print(f"mean time spent in failed attempts: {failed_time / seeds * 1000:.2f} ms per success")
+    for reason, count in failure_reasons.most_common():
+        print(f"  {reason}: {count}")
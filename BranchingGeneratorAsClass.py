@@ -1,12 +1,17 @@
 import json
 import time
 import traceback
-from copy import deepcopy
-from random import randint, uniform, seed, shuffle
+from random import Random
 import sys
-
-frames = 0
-max_recursion_depth_reached = 0
+from bisect import bisect_right
+from time import perf_counter
+from RoomSet import load_room_set, CompiledRoom, RoomConnection
+from Grid import Grid, EMPTY, room_masks
+from WeightTable import WeightTable
+from Frontier import Frontier, DEPTH_FIRST
+from FloorGraph import RoomGraph, FarthestIndex, WalkIndex, MANHATTAN, WALK, DISTANCES
+from PlacementMemo import PlacementMemo
+from Exporter import export_package
 
 # Lock bit positions
 BOMB_LOCK: int =                                 0b1
@@ -30,7 +35,26 @@ MULTIPLAYER_LOCK_2P: int =      0b100000000000000000
 MULTIPLAYER_LOCK: int =        0b1000000000000000000
 
 UNIQUE_ROOMS = False
-START = (3,3) # Coordinate of the top-left corner in the output space
+FRONTIER_ORDERING: str = DEPTH_FIRST # Order in which open connections get rooms, see Frontier.py
+TELEPORTER_DISTANCE: str = MANHATTAN # Distance by which dead ends are paired with the farthest other dead end, see FloorGraph.py
+# Choice of the boss room among the free single tile dead ends
+RANDOM_DEAD_END: str = "random"
+FARTHEST_DEAD_END: str = "farthest" # The one with the most rooms to walk through from the start
+BOSS_PLACEMENTS: tuple = (RANDOM_DEAD_END, FARTHEST_DEAD_END)
+BOSS_PLACEMENT: str = RANDOM_DEAD_END
+# Placement checks a generator remembers, see PlacementMemo.py. 0 turns the memo off. Off by default: about half the lookups hit on
+# full size maps, but building the key costs about as much as the bitboard check it saves, see Benchmarks/PlacementMemo.py
+PLACEMENT_MEMO_SIZE: int = 0
+PLACEMENT_MEMO_MAX_TILES: int = 2 # Rooms with more tiles are always checked directly, their neighbourhoods rarely repeat
+# Only place rooms through connections that leave every cell their doors lead to closable by a dead end, see leaves_closable_cells.
+# Changes which floors seeds give, so it is off by default
+CLOSURE_STEERING: bool = False
+BACKTRACK_BUDGET: int = 8 # How often a generation may undo rooms to retry a branch before the floor counts as failed
+BACKTRACK_ROOMS: int = 4 # How many of the last placed rooms get undone per backtrack
+# Levels for FloorGenerator.log_level
+LOG_QUIET: int = 0 # Print nothing
+LOG_INFO: int = 1 # Print item and teleporter placements and rerolls
+LOG_LEVEL: int = LOG_INFO
 BOSS_KEY: int = 1000
 # Names of the Major items. Used for printing item placements
 ITEM_NAME_MAPPING = {
@@ -62,6 +86,82 @@ NO_WALL: int = 0
 WALL: int = 1
 DOOR: int = 2
 
+# Reasons for a failed generation, stored in FloorGenerator.failure_reason
+NO_DEAD_END_FITS: str = "no dead end fits"
+NOT_ENOUGH_KEY_LOCATIONS: str = "not enough key locations"
+NO_BOSS_DEAD_END: str = "no dead end for the boss"
+# Reasons for a generation that was stopped before it could finish. The grid holds the rooms placed until then
+TIME_BUDGET_EXCEEDED: str = "time budget exceeded"
+ITERATION_BUDGET_EXCEEDED: str = "iteration budget exceeded"
+CANCELLED: str = "cancelled"
+STOP_REASONS: tuple = (TIME_BUDGET_EXCEEDED, ITERATION_BUDGET_EXCEEDED, CANCELLED)
+BUDGET_CHECK_INTERVAL: int = 32 # Frontier iterations between two checks of the time budget and the cancel token. Must be a power of 2
+# Budgets of __main__, shared by all rerolls. None for no limit
+MAIN_TIME_BUDGET: float = 60.0 # Seconds
+MAIN_ITERATION_BUDGET: int = None # Frontier iterations
+
+# Counters and phase timings collected while generating a floor. Timings are in seconds
+class GenerationStats:
+    def __init__(self):
+        self.room_set_load_seconds: float = 0.0
+        # Building the room lists and weight tables for a connection, mostly get_possible_rooms
+        self.possible_rooms_seconds: float = 0.0
+        self.validation_seconds: float = 0.0
+        # Drawing rooms from the weight tables
+        self.selection_seconds: float = 0.0
+        self.draw_room_seconds: float = 0.0
+        self.key_placement_seconds: float = 0.0
+        self.teleporter_seconds: float = 0.0
+        # Set by whoever turns the floor into a package
+        self.export_seconds: float = 0.0
+        self.total_seconds: float = 0.0
+        # Rooms drawn from a weight table and checked with validate_room_position, and how many of them fit
+        self.candidates_validated: int = 0
+        self.candidates_accepted: int = 0
+        # Connections that no room fit at, which got closed with a dead end
+        self.dead_end_fallbacks: int = 0
+        # Failed floors before this one, set by whoever rerolls
+        self.rerolls: int = 0
+        self.max_depth: int = 0
+        self.possible_rooms_cache_hits: int = 0
+        self.possible_rooms_cache_misses: int = 0
+        self.frontier_iterations: int = 0
+        self.peak_frontier_size: int = 0
+        self.duplicate_frontier_targets: int = 0
+        # Frontier entries whose target got filled by another room before they came up. Each of them used to cost a full iteration
+        self.stale_frontier_entries_skipped: int = 0
+        self.backtracks: int = 0
+        self.rooms_undone: int = 0
+
+    def possible_rooms_cache_hit_rate(self) -> float:
+        lookups = self.possible_rooms_cache_hits + self.possible_rooms_cache_misses
+        return self.possible_rooms_cache_hits / lookups if lookups > 0 else 0.0
+
+    # Returns the stats as a dict that can be written as JSON
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+# Undo journal entry for one room drawn by FloorGenerator.draw_room. Holds everything needed to take the room out again:
+# the grid cells it wrote, the lengths of the lists it appended to and the state it replaced
+class RoomRecord:
+    __slots__ = ("layout_id", "cells", "opened_doors", "connected_doors", "tiles_with_items_len", "item_data_len", "inv_len", "lock_states",
+                 "majors_taken", "key_places", "placed_dead_ends_len", "retired_room", "frontier_mark")
+
+    def __init__(self, generator):
+        self.layout_id: int = generator.layout_id
+        self.cells: list = []
+        self.opened_doors: list = [] # Keys the room added to open_doors
+        self.connected_doors: list = [] # (key, door) of the open doors the room connected to
+        self.tiles_with_items_len: int = len(generator.tiles_with_items)
+        self.item_data_len: int = len(generator.item_data)
+        self.inv_len: int = len(generator.inv)
+        self.lock_states: int = generator.possible_lock_states
+        self.majors_taken: list = [] # (index in possible_majors, item id)
+        self.key_places: list = []
+        self.placed_dead_ends_len: int = len(generator.placed_dead_ends)
+        self.retired_room: int = None
+        self.frontier_mark: int = None
+
 # Data Container class to hold information about a tile in the grid
 class Tile:
     def __init__(self, r: int, u: int, l: int, d: int, room_id: int, layout_id: int, bounding_box_offset: tuple):
@@ -74,7 +174,21 @@ class Tile:
         self.bounding_box_offset = bounding_box_offset
 
 class FloorGenerator:
-    def __init__(self, width: int, height: int, room_data_file_path: str, start_inventory: list):
+    def __init__(self, width: int, height: int, room_data_file_path: str, start_inventory: list, frontier_ordering: str = FRONTIER_ORDERING,
+                 backtrack_budget: int = BACKTRACK_BUDGET, rng: Random = None, log_level: int = LOG_LEVEL,
+                 teleporter_distance: str = TELEPORTER_DISTANCE, boss_placement: str = BOSS_PLACEMENT, closure_steering: bool = CLOSURE_STEERING):
+        if not teleporter_distance in DISTANCES:
+            raise ValueError(f"Unknown teleporter distance '{teleporter_distance}'")
+        if not boss_placement in BOSS_PLACEMENTS:
+            raise ValueError(f"Unknown boss placement '{boss_placement}'")
+        self.teleporter_distance: str = teleporter_distance
+        self.boss_placement: str = boss_placement
+        self.closure_steering: bool = closure_steering
+        # Every random draw of the generation comes from this, so generators don't share random state. Rerolls of the same floor
+        # keep using the same instance, which makes a seed reproduce the floor it ended with
+        self.rng: Random = rng if rng is not None else Random()
+        self.log_level: int = log_level
+        self.stats: GenerationStats = GenerationStats()
         self.width: int = width
         self.height: int = height
         self.room_data: list = []
@@ -82,9 +196,11 @@ class FloorGenerator:
         self.up_door_rooms: list = []
         self.left_door_rooms: list = []
         self.down_door_rooms: list = []
+        self.depth_breakpoints: tuple = ()
+        # Dead ends that can close a connection by door direction and neighbourhood of the target cell, see RoomSet.closure_table
+        self.closures: tuple = ()
         self.read_room_data(room_data_file_path)
-        self.grid: dict = self.create_grid(width, height)
-        self.dead_ends: list = self.get_dead_ends(self.room_data)
+        self.grid: Grid = self.create_grid(width, height)
         self.placed_dead_ends: list = []
         self.inv: list = start_inventory
         self.possible_majors: list = [m for m in ITEM_NAME_MAPPING.keys() if not m in self.inv and m != BOSS_KEY]
@@ -92,30 +208,60 @@ class FloorGenerator:
         self.possible_lock_states: int = self.inventory_to_lock_states(self.inv)
         self.start_pos: tuple = (0,0)
         self.layout_id: int = 1
-        self.transition_data: dict = {}
-        self.placed_doors: list = []
+        # Rows of RoomData and the doors of every room, indexed by layout id. A row is [room id, x, y] of the room's bounding box,
+        # a door is [bounding box x, bounding box y, direction, target] with target [layout id, bounding box x, bounding box y] of
+        # the tile behind the door, or None while that tile is empty. Teleporters are doors in direction BACK
+        self.room_rows: list = []
+        self.room_doors: list = []
+        # Doors whose target is still empty, keyed by grid index * 4 + direction
+        self.open_doors: dict = {}
+        # Which rooms can be walked to from which, including teleporters
+        self.room_graph: RoomGraph = RoomGraph()
+        self.placement_memo: PlacementMemo = PlacementMemo(PLACEMENT_MEMO_SIZE) if PLACEMENT_MEMO_SIZE > 0 else None
+        # Grid index offsets of the tiles of a connection relative to its door, for the placement memo
+        self.connection_deltas: dict = {}
         self.item_data: dict = {}
         self.keys_to_place: int = 0
         self.potential_key_places: set = set()
         self.boss_tile: tuple = None
         self.teleporter_transitions: dict = {}
+        # Indices of rooms that can't be placed again because UNIQUE_ROOMS is on
+        self.retired_rooms: set = set()
+        # Results of get_possible_rooms keyed by (door_dir, depth bucket, lock states)
+        self.possible_rooms_cache: dict = {}
+        # Results of get_weight_table keyed by (door_dir, depth, lock states)
+        self.weight_tables: dict = {}
+        self.frontier: Frontier = Frontier(frontier_ordering, self.rng.randint, journaling = backtrack_budget > 0)
+        # Undo journal with a RoomRecord for every room drawn during generate
+        self.journal: list = []
+        self.backtrack_budget: int = backtrack_budget
+        self.empty_cells: int = width * height
+        # Set to one of the failure reasons above when generate_floor fails
+        self.failure_reason: str = None
+        # Limits of the running generate_floor call, see budget_exhausted
+        self.deadline: float = None
+        self.iteration_budget: int = None
+        self.cancel_token = None
     
+    # Loads the room set through the compiled cache. The room set is shared between all generators of the process
     def read_room_data(self, file_path: str) -> None:
+        start_time = perf_counter()
         try:
-            with open(file_path, "r") as file:
-                full_dict: dict = json.load(file)
-            
-            self.room_data = full_dict["AllRooms"]
-            self.right_door_rooms = full_dict["RightDoorRooms"]
-            self.up_door_rooms = full_dict["UpDoorRooms"]
-            self.left_door_rooms = full_dict["LeftDoorRooms"]
-            self.down_door_rooms = full_dict["DownDoorRooms"]
+            room_set = load_room_set(file_path)
+            self.room_data = room_set.room_data
+            self.right_door_rooms = room_set.right_door_rooms
+            self.up_door_rooms = room_set.up_door_rooms
+            self.left_door_rooms = room_set.left_door_rooms
+            self.down_door_rooms = room_set.down_door_rooms
+            self.depth_breakpoints = room_set.depth_breakpoints
+            self.closures = room_set.closures
+            self.stats.room_set_load_seconds = perf_counter() - start_time
         except FileNotFoundError:
             print(f"Could not find file '{file_path}'")
             exit(1)
 
     def first_room(self) -> Tile:
-        start_pos = (randint(0, self.width-1), randint(0, self.height-1))
+        start_pos = (self.rng.randint(0, self.width-1), self.rng.randint(0, self.height-1))
         self.start_pos = start_pos
         if start_pos[0] == 0:
             possible_start_tiles = [Tile(DOOR, WALL, WALL, WALL, 409, 0, (0,0))]
@@ -127,16 +273,53 @@ class FloorGenerator:
             Tile(WALL, WALL, DOOR, WALL, 407, 0, (0,0)),
         ]
 
-        start_tile = possible_start_tiles[randint(0, len(possible_start_tiles)-1)]
+        start_tile = possible_start_tiles[self.rng.randint(0, len(possible_start_tiles)-1)]
         self.grid[start_pos] = start_tile
+        self.empty_cells -= 1
+        self.room_rows.append([start_tile.room_id, start_pos[0], start_pos[1]])
+        self.room_doors.append([])
+        self.room_graph.add_room()
+        start_index = start_pos[1] * self.width + start_pos[0]
         if start_tile.l == DOOR:
-            self.placed_doors.append((start_pos, LEFT))
+            self.add_door(start_index, LEFT, start_index - 1, 0, (0,0), None)
         else:
-            self.placed_doors.append((start_pos, RIGHT))
+            self.add_door(start_index, RIGHT, start_index + 1, 0, (0,0), None)
 
         return (start_pos, start_tile)
 
-    def generate_floor(self, boss_keys: int = 0) -> bool:
+    # Generates the floor and returns True if it succeeded. The generation stops early with failure_reason set to one of
+    # STOP_REASONS if it takes longer than time_budget seconds or iteration_budget frontier iterations, or once cancel_token is set.
+    # cancel_token can be anything with an is_set() method, like a threading.Event or a multiprocessing Event
+    def generate_floor(self, boss_keys: int = 0, time_budget: float = None, iteration_budget: int = None, cancel_token = None) -> bool:
+        start_time = perf_counter()
+        self.deadline = None if time_budget is None else start_time + time_budget
+        self.iteration_budget = iteration_budget
+        self.cancel_token = cancel_token
+        success = self.generate_floor_phases(boss_keys)
+        self.stats.total_seconds = perf_counter() - start_time
+        return success
+
+    def is_stopped(self) -> bool:
+        return self.failure_reason in STOP_REASONS
+
+    # Returns True and sets failure_reason if the iteration budget is used up, or, every BUDGET_CHECK_INTERVAL iterations,
+    # if the time budget is used up or the generation was cancelled
+    def budget_exhausted(self) -> bool:
+        iterations = self.stats.frontier_iterations
+        if self.iteration_budget is not None and iterations >= self.iteration_budget:
+            self.failure_reason = ITERATION_BUDGET_EXCEEDED
+            return True
+        if iterations & (BUDGET_CHECK_INTERVAL - 1) != 0:
+            return False
+        if self.cancel_token is not None and self.cancel_token.is_set():
+            self.failure_reason = CANCELLED
+            return True
+        if self.deadline is not None and perf_counter() >= self.deadline:
+            self.failure_reason = TIME_BUDGET_EXCEEDED
+            return True
+        return False
+
+    def generate_floor_phases(self, boss_keys: int) -> bool:
         self.keys_to_place = boss_keys
         next_pos = (0,0)
         direction = 0
@@ -151,31 +334,94 @@ class FloorGenerator:
             next_pos = start_pos
             direction = 0
 
+        # generate stops early and sets failure_reason as soon as the floor can't be finished successfully anymore
         self.generate(self.grid, next_pos, direction, 0)
-        correct_keys: bool = self.place_remaining_boss_keys()
+        if self.failure_reason is not None:
+            return False
+        phase_start = perf_counter()
+        keys_placed = self.place_remaining_boss_keys()
+        self.stats.key_placement_seconds = perf_counter() - phase_start
+        if not keys_placed:
+            self.failure_reason = NOT_ENOUGH_KEY_LOCATIONS
+            return False
         placed_dead_ends = [e for e in self.placed_dead_ends if not e in self.tiles_with_items]
-        successful_generation: bool = (len(placed_dead_ends) != 0) and correct_keys
-        if not successful_generation:
+        if len(placed_dead_ends) == 0:
+            self.failure_reason = NO_BOSS_DEAD_END
             return False
         
-        self.boss_tile = placed_dead_ends.pop(randint(0, len(placed_dead_ends)-1))
+        self.boss_tile = placed_dead_ends.pop(self.choose_boss_dead_end(placed_dead_ends))
+        phase_start = perf_counter()
         self.place_dead_end_teleporters(placed_dead_ends)
-        return successful_generation
+        self.stats.teleporter_seconds = perf_counter() - phase_start
+        return True
 
-# Returns a dict where coordinate tuples are the key and None is the value
-    def create_grid(self, w: int, h: int) -> dict:
-        return {(x,y): None for y in range(h) for x in range(w)}
+    # Returns False if the floor can't get enough potential boss key locations anymore. Every future key location needs an empty cell that
+    # a future room can reach, which means a cell connected to one of the frontier's targets
+    def can_still_place_keys(self) -> bool:
+        missing = self.keys_to_place - len(self.potential_key_places)
+        if missing <= 0:
+            return True
+        if missing > self.empty_cells:
+            return False
+        # Every frontier target is an empty cell of its own
+        if len(self.frontier) >= missing:
+            return True
+        # Counting the reachable cells is only worth it when the frontier is about to run dry or the map is almost full
+        if len(self.frontier) > 2 and self.empty_cells > 2 * missing:
+            return True
+        return self.count_reachable_empty_cells(missing) >= missing
 
-    # Returns a list of all rooms with only 1 door
-    def get_dead_ends(self, data: list) -> list:
-        return [r for r in data if r["IsDeadEnd"]]
+    # Counts the empty cells connected to the frontier's targets, stopping as soon as limit cells were found
+    def count_reachable_empty_cells(self, limit: int) -> int:
+        cells = self.grid.walls
+        width = self.width
+        height = self.height
+        seen = set(y * width + x for x, y in self.frontier.live)
+        to_visit = list(seen)
+        while len(to_visit) > 0 and len(seen) < limit:
+            index = to_visit.pop()
+            x = index % width
+            neighbours = []
+            if x + 1 < width: neighbours.append(index + 1)
+            if x > 0: neighbours.append(index - 1)
+            if index >= width: neighbours.append(index - width)
+            if index + width < width * height: neighbours.append(index + width)
+            for neighbour in neighbours:
+                if cells[neighbour] == EMPTY and not neighbour in seen:
+                    seen.add(neighbour)
+                    to_visit.append(neighbour)
+        return len(seen)
 
-    # Returns true if the room has a door that points in the direction of door_dir. door_dir is an index into the layout tile's data
-    def has_door(self, door_tiles_arr: list, door_dir: int) -> bool:
-        return len(door_tiles_arr[door_dir]) > 0
+    # Returns an empty array backed grid that is indexed with coordinate tuples
+    def create_grid(self, w: int, h: int) -> Grid:
+        return Grid(w, h)
 
-    # Returns a list of rooms filtered by their probability (weight) and if they have a door in the direction given
+    # Returns a list of rooms filtered by their probability (weight) and if they have a door in the direction given.
+    # The result only changes when the depth crosses one of the room set's depth breakpoints, when the lock states change or when
+    # UNIQUE_ROOMS retires a room, so it is cached. The returned list is shared with the cache and must not be modified
     def get_possible_rooms(self, door_dir: int, depth: int) -> list:
+        cache_key = (door_dir, bisect_right(self.depth_breakpoints, depth), self.possible_lock_states)
+        possible_rooms = self.possible_rooms_cache.get(cache_key)
+        if possible_rooms is not None:
+            self.stats.possible_rooms_cache_hits += 1
+            return possible_rooms
+        self.stats.possible_rooms_cache_misses += 1
+        possible_rooms = self.filter_possible_rooms(door_dir, depth)
+        self.possible_rooms_cache[cache_key] = possible_rooms
+        return possible_rooms
+
+    # Returns a WeightTable over the possible rooms for the door direction and depth. The table is cached, draw from a copy of it
+    def get_weight_table(self, door_dir: int, depth: int) -> WeightTable:
+        cache_key = (door_dir, depth, self.possible_lock_states)
+        table = self.weight_tables.get(cache_key)
+        if table is None:
+            possible_rooms = self.get_possible_rooms(door_dir, depth)
+            table = WeightTable(possible_rooms, [self.room_weight(room, depth) for room in possible_rooms])
+            self.weight_tables[cache_key] = table
+        return table
+
+    # Uncached version of get_possible_rooms
+    def filter_possible_rooms(self, door_dir: int, depth: int) -> list:
         if door_dir == RIGHT:
             examine_list = self.right_door_rooms
         elif door_dir == UP:
@@ -184,128 +430,216 @@ class FloorGenerator:
             examine_list = self.left_door_rooms
         elif door_dir == DOWN:
             examine_list = self.down_door_rooms
-        # Remove rooms from consideration if the room has a weight of 0
-        possible_rooms = [r for r in examine_list if (self.room_weight(self.room_data[r], depth) > 0)]
-        possible_rooms = list(map(lambda x: self.room_data[x], possible_rooms))
-        idx = 0
-        while idx < len(possible_rooms):
-            room = possible_rooms[idx]
-            # Check if the player needs specific items to traverse the room
-            is_locked = not self.is_location_open(room["Lock"])
-            # Remove room from possibilities if it does not have a door in the correct direction or if it is locked behind an item
-            if is_locked:
-                del possible_rooms[idx]
-                continue
-            else:
-                idx += 1
-        
-        return possible_rooms
+        # Remove rooms from consideration if the room has a weight of 0 or if the player needs items to traverse the room that they don't have yet
+        return [r for r in examine_list if self.room_weight(r, depth) > 0 and self.is_location_open(r.lock)]
 
 
-    # Returns a list of local coordinate keys with tiles that have doors in the given door direction
-    def start_positions(self, layout: dict, door_dir: int) -> list:
-        return [k for k in layout if layout[k][door_dir] == DOOR]
+    # Returns a list of local tile offsets of tiles that have doors in the given door direction
+    def start_positions(self, room: CompiledRoom, door_dir: int) -> list:
+        return [room.tiles[i] for i in range(len(room.tiles)) if room.walls[i][door_dir] == DOOR]
 
-    # Bounding box is [origin_x, origin_y, size_x, size_y]
-    def is_bounding_box_inside(self, origin_x: int, origin_y: int, size_x: int, size_y: int) -> bool:
-        return origin_x >= 0 and origin_y >= 0 and (origin_x + size_x) < self.width and (origin_y + size_y) < self.height
+    # Checks if a room can go next to another room when its door described by connection is placed at global_start_pos.
+    # Works on the grid's bitboards: every check is a shift of one of the room's masks and an AND with a grid bitboard
+    def validate_room_position(self, grid: Grid, global_start_pos: tuple, connection: RoomConnection) -> bool:
+        # The door has to be far enough away from the map's edges for the room's bounding box to fit
+        if global_start_pos[0] < connection.anchor_min_x or global_start_pos[1] < connection.anchor_min_y or\
+            global_start_pos[0] + connection.anchor_margin_x >= self.width or global_start_pos[1] + connection.anchor_margin_y >= self.height:
+            return False
 
-    # Checks if a room can go next to another room
-    def validate_room_position(self, grid: dict, global_start_pos: tuple, relative_key: str, room: dict) -> bool:
-        layout = room["Layout"]
-        bounding_box = room["BoundingBox"]
-        # Convert the key in the layout dict to a coordinate tuple
-        relative_door_position = tuple(map(int, relative_key.split(",")))
-        # The position where the room's relative origin tile is located globally
-        draw_begin = (global_start_pos[0] - relative_door_position[0], global_start_pos[1] - relative_door_position[1])
-        if not self.is_bounding_box_inside(draw_begin[0] + bounding_box[0], draw_begin[1] + bounding_box[1], bounding_box[2], bounding_box[3]):
+        stride = grid.stride
+        masks = connection.room.masks.get(stride) or room_masks(connection.room, stride)
+        # Shift that moves the room masks onto the bounding box origin, bitboard rows have a border cell on every side
+        shift = (global_start_pos[1] - connection.anchor_min_y + 1) * stride + global_start_pos[0] - connection.anchor_min_x + 1
+        # Room is invalid if it overlaps another room
+        if (masks.occupancy << shift) & grid.occupancy:
+            return False
+        door = masks.door
+        wall = masks.wall
+        # Invalidate rooms if they have a transition into a wall or out of bounds
+        if ((door[RIGHT] << (shift + 1)) & grid.wall[LEFT]) or ((door[UP] << (shift - stride)) & grid.wall[DOWN])\
+            or ((door[LEFT] << (shift - 1)) & grid.wall[RIGHT]) or ((door[DOWN] << (shift + stride)) & grid.wall[UP]):
+            return False
+        # Invalidate rooms if they have a wall where a neighbour has a transition
+        if ((wall[RIGHT] << (shift + 1)) & grid.door[LEFT]) or ((wall[UP] << (shift - stride)) & grid.door[DOWN])\
+            or ((wall[LEFT] << (shift - 1)) & grid.door[RIGHT]) or ((wall[DOWN] << (shift + stride)) & grid.door[UP]):
+            return False
+        return True
+
+    # Returns the connections of room in door_dir through which the room can be placed with its door at next_tile
+    def valid_connections(self, grid: Grid, next_tile: tuple, room: CompiledRoom, door_dir: int) -> list:
+        if self.placement_memo is None or len(room.tiles) > PLACEMENT_MEMO_MAX_TILES:
+            return [c for c in room.connections[door_dir] if self.validate_room_position(grid, next_tile, c)]
+        return [c for c in room.connections[door_dir] if self.validate_room_position_memoized(grid, next_tile, c)]
+
+    # Same as validate_room_position, but looks the result up in the placement memo by the neighbourhood of the room's cells
+    def validate_room_position_memoized(self, grid: Grid, global_start_pos: tuple, connection: RoomConnection) -> bool:
+        if global_start_pos[0] < connection.anchor_min_x or global_start_pos[1] < connection.anchor_min_y or\
+            global_start_pos[0] + connection.anchor_margin_x >= self.width or global_start_pos[1] + connection.anchor_margin_y >= self.height:
+            return False
+        deltas = self.connection_deltas.get(connection)
+        if deltas is None:
+            deltas = tuple(offset[1] * self.width + offset[0] for offset in connection.offsets)
+            self.connection_deltas[connection] = deltas
+        walls = grid.walls
+        facing = grid.facing
+        start_index = global_start_pos[1] * self.width + global_start_pos[0]
+        signature = 0
+        for delta in deltas:
+            index = start_index + delta
+            if walls[index] != EMPTY:
+                return False
+            signature = (signature << 8) | facing[index]
+        key = (connection, signature)
+        fits = self.placement_memo.get(key)
+        if fits is None:
+            fits = self.validate_room_position(grid, global_start_pos, connection)
+            self.placement_memo.put(key, fits)
+        return fits
+
+    # Returns False if placing the room through connection at next_tile would leave a door leading to an empty cell that no dead end
+    # can go into anymore, like a cell that two doors lead to. The room has to fit there
+    def leaves_closable_cells(self, grid: Grid, next_tile: tuple, connection: RoomConnection) -> bool:
+        walls = grid.walls
+        targets = {}
+        for x, y, direction in connection.exits:
+            index = (next_tile[1] + y) * self.width + next_tile[0] + x
+            if walls[index] == EMPTY:
+                targets[index] = targets.get(index, grid.facing[index]) | (DOOR << (((direction + 2) & 3) << 1))
+        for index, pattern in targets.items():
+            # The highest direction with a door. Any of them will do, a dead end there has to close all of them
+            door_dir = ((pattern & 0b10101010).bit_length() - 2) >> 1
+            if len(self.closures[door_dir][pattern]) == 0:
+                return False
+        return True
+
+    # Tile by tile version of validate_room_position. Slower, but kept as the reference the bitboard checks are compared against
+    def validate_room_position_reference(self, grid: Grid, global_start_pos: tuple, connection: RoomConnection) -> bool:
+        width = self.width
+        height = self.height
+        # The door has to be far enough away from the map's edges for the room's bounding box to fit
+        min_x, min_y, max_x, max_y = connection.anchor_range(width, height)
+        if not (min_x <= global_start_pos[0] <= max_x and min_y <= global_start_pos[1] <= max_y):
             return False
         
-        for key in layout:
-            # Convert tile's relative offset into global position
-            relative_tile_pos = tuple(map(int, key.split(",")))
-            global_tile_pos = (draw_begin[0] + relative_tile_pos[0], draw_begin[1] + relative_tile_pos[1])
+        cells = grid.walls
+        walls = connection.room.walls
+        for i, offset in enumerate(connection.offsets):
+            # Convert tile's offset relative to the door into global position
+            x = global_start_pos[0] + offset[0]
+            y = global_start_pos[1] + offset[1]
+            index = y * width + x
+            tile_walls = walls[i]
             # Room is invalid if it has tile out of bounds or if it overlaps another room or if it's on the edge and has a transition pointing out of bounds
-            if grid[global_tile_pos] != None or\
-                (global_tile_pos[0] == 0 and layout[key][LEFT] == DOOR) or (global_tile_pos[0] == self.width-1 and layout[key][RIGHT] == DOOR) or\
-                (global_tile_pos[1] == 0 and layout[key][UP] == DOOR) or (global_tile_pos[1] == self.height-1 and layout[key][DOWN] == DOOR):
+            if cells[index] != EMPTY or\
+                (x == 0 and tile_walls[LEFT] == DOOR) or (x == width-1 and tile_walls[RIGHT] == DOOR) or\
+                (y == 0 and tile_walls[UP] == DOOR) or (y == height-1 and tile_walls[DOWN] == DOOR):
                 return False
-        
-            right_pos = (global_tile_pos[0] + 1, global_tile_pos[1])
-            top_pos = (global_tile_pos[0], global_tile_pos[1] - 1)
-            left_pos = (global_tile_pos[0] - 1, global_tile_pos[1])
-            bottom_pos = (global_tile_pos[0], global_tile_pos[1] + 1)
+
+            # Packed walls of the neighbouring cells, EMPTY if the neighbour is out of bounds or has no tile
+            right_cell = cells[index + 1] if x + 1 < width else EMPTY
+            top_cell = cells[index - width] if y > 0 else EMPTY
+            left_cell = cells[index - 1] if x > 0 else EMPTY
+            bottom_cell = cells[index + width] if y + 1 < height else EMPTY
 
             # Invalidate rooms if they have a transition into a wall
-            if ((right_pos[0] >= self.width or (grid[right_pos] and grid[right_pos].l == WALL)) and layout[key][RIGHT] == DOOR)\
-                or ((top_pos[1] < 0 or (grid[top_pos] and grid[top_pos].d == WALL)) and layout[key][UP] == DOOR)\
-                or ((left_pos[0] < 0 or (grid[left_pos] and grid[left_pos].r == WALL)) and layout[key][LEFT] == DOOR)\
-                or ((bottom_pos[1] >= self.height or (grid[bottom_pos] and grid[bottom_pos].u == WALL)) and layout[key][DOWN] == DOOR):
+            if (tile_walls[RIGHT] == DOOR and right_cell != EMPTY and (right_cell >> 4) & 0b11 == WALL)\
+                or (tile_walls[UP] == DOOR and top_cell != EMPTY and (top_cell >> 6) & 0b11 == WALL)\
+                or (tile_walls[LEFT] == DOOR and left_cell != EMPTY and left_cell & 0b11 == WALL)\
+                or (tile_walls[DOWN] == DOOR and bottom_cell != EMPTY and (bottom_cell >> 2) & 0b11 == WALL):
                 return False
 
-            if right_pos[0] < self.width:
-                if (grid[right_pos] and grid[right_pos].l == DOOR) and layout[key][RIGHT] == WALL:
-                    return False
-            if top_pos[1] > 0:
-                if (grid[top_pos] and grid[top_pos].d == DOOR) and layout[key][UP] == WALL:
-                    return False
-            if left_pos[0] > 0:
-                if (grid[left_pos] and grid[left_pos].r == DOOR) and layout[key][LEFT] == WALL:
-                    return False
-            if bottom_pos[1] < self.height:
-                if (grid[bottom_pos] and grid[bottom_pos].u == DOOR) and layout[key][DOWN] == WALL:
-                    return False
+            # Invalidate rooms if they have a wall where a neighbour has a transition
+            if tile_walls[RIGHT] == WALL and right_cell != EMPTY and (right_cell >> 4) & 0b11 == DOOR:
+                return False
+            if tile_walls[UP] == WALL and top_cell != EMPTY and (top_cell >> 6) & 0b11 == DOOR:
+                return False
+            if tile_walls[LEFT] == WALL and left_cell != EMPTY and left_cell & 0b11 == DOOR:
+                return False
+            if tile_walls[DOWN] == WALL and bottom_cell != EMPTY and (bottom_cell >> 2) & 0b11 == DOOR:
+                return False
 
         return True
 
     def place_item(self, item_id: int, layout_id: int, bounding_box_offset: tuple, grid_pos: tuple) -> None:
-        debug_message: str = f"Placed {ITEM_NAME_MAPPING[item_id]} (ID {item_id}) in Tile {grid_pos}"
         if (item_id != BOSS_KEY):
             self.inv.append(item_id)
             # Consider the item to be collected for the rest of the generation
             self.possible_lock_states = self.inventory_to_lock_states(self.inv)
-        else:
-            debug_message += f". {self.keys_to_place} Keys remaining."
+            # Cached room lists for the old lock states can't be used anymore
+            self.possible_rooms_cache.clear()
+            self.weight_tables.clear()
         self.tiles_with_items.append(grid_pos)
         item_key: str = f"{layout_id}_{bounding_box_offset[0]}_{bounding_box_offset[1]}"
         self.item_data[item_key] = item_id
-        print(debug_message)
+        if self.log_level >= LOG_INFO:
+            debug_message: str = f"Placed {ITEM_NAME_MAPPING[item_id]} (ID {item_id}) in Tile {grid_pos}"
+            if item_id == BOSS_KEY:
+                debug_message += f". {self.keys_to_place} Keys remaining."
+            print(debug_message)
+
+    # Adds the door of the tile at grid_index in direction to the doors of its room. If the tile behind it is already placed, both
+    # doors get each other as target, otherwise the door stays open until a room is drawn there. Returns True if the door is open
+    def add_door(self, grid_index: int, direction: int, neighbour_index: int, layout_id: int, bounding_box_offset: tuple, record: RoomRecord) -> bool:
+        door = [bounding_box_offset[0], bounding_box_offset[1], direction, None]
+        self.room_doors[layout_id].append(door)
+        grid = self.grid
+        if grid.walls[neighbour_index] == EMPTY:
+            key = (grid_index << 2) | direction
+            self.open_doors[key] = door
+            if record is not None:
+                record.opened_doors.append(key)
+            return True
+        door[3] = [grid.layout_ids[neighbour_index], grid.bounding_box_x[neighbour_index], grid.bounding_box_y[neighbour_index]]
+        key = (neighbour_index << 2) | ((direction + 2) & 3)
+        other_door = self.open_doors.pop(key, None)
+        if other_door is not None:
+            other_door[3] = [layout_id, bounding_box_offset[0], bounding_box_offset[1]]
+            record.connected_doors.append((key, other_door))
+            if door[3][0] != layout_id:
+                self.room_graph.connect(layout_id, door[3][0])
+        return False
 
-    # Writes the tile data into the grid
-    def draw_room(self, draw_begin: tuple, room: dict, open_connections: list):
-        layout = room["Layout"]
-        bounding_box_origin = (room["BoundingBox"][0], room["BoundingBox"][1])
+    # Writes the tile data into the grid. Returns the RoomRecord that undo_room needs to take the room out again
+    def draw_room(self, draw_begin: tuple, room: CompiledRoom, open_connections: list) -> RoomRecord:
+        record = RoomRecord(self)
         placed_key_item: bool = False
-        for key in layout:
-            tile_pos = tuple(map(int, key.split(",")))
-            bounding_box_offset = (tile_pos[0] - bounding_box_origin[0], tile_pos[1] - bounding_box_origin[1])
+        layout_id = self.layout_id
+        first_offset = room.bounding_box_offsets[0]
+        self.room_rows.append([room.room_id, draw_begin[0] + room.tiles[0][0] - first_offset[0], draw_begin[1] + room.tiles[0][1] - first_offset[1]])
+        self.room_doors.append([])
+        self.room_graph.add_room()
+        for i, tile_pos in enumerate(room.tiles):
+            bounding_box_offset = room.bounding_box_offsets[i]
             grid_pos = (draw_begin[0] + tile_pos[0], draw_begin[1] + tile_pos[1])
-            tile_data = layout[key]
-            self.grid[grid_pos] = Tile(tile_data[0], tile_data[1], tile_data[2], tile_data[3], room["RoomID"], self.layout_id, bounding_box_offset)
-            if tile_data[RIGHT] == DOOR:
-                self.placed_doors.append((grid_pos, RIGHT))
-                if not self.grid[(grid_pos[0] + 1, grid_pos[1])]:
+            grid_index = grid_pos[1] * self.width + grid_pos[0]
+            tile_data = room.walls[i]
+            self.grid.set_tile(grid_index, tile_data[0], tile_data[1], tile_data[2], tile_data[3], room.room_id, self.layout_id, bounding_box_offset)
+            record.cells.append(grid_index)
+            self.frontier.invalidate(grid_pos)
+            self.empty_cells -= 1
+            door_mask = room.door_masks[i]
+            if door_mask & (1 << RIGHT):
+                if self.add_door(grid_index, RIGHT, grid_index + 1, layout_id, bounding_box_offset, record):
                     open_connections.append([(grid_pos[0] + 1, grid_pos[1]), LEFT])
-            if tile_data[UP] == DOOR:
-                self.placed_doors.append((grid_pos, UP))
-                if not self.grid[(grid_pos[0], grid_pos[1] - 1)]:
+            if door_mask & (1 << UP):
+                if self.add_door(grid_index, UP, grid_index - self.width, layout_id, bounding_box_offset, record):
                     open_connections.append([(grid_pos[0], grid_pos[1] - 1), DOWN])
-            if tile_data[LEFT] == DOOR:
-                self.placed_doors.append((grid_pos, LEFT))
-                if not self.grid[(grid_pos[0] - 1, grid_pos[1])]:
+            if door_mask & (1 << LEFT):
+                if self.add_door(grid_index, LEFT, grid_index - 1, layout_id, bounding_box_offset, record):
                     open_connections.append([(grid_pos[0] - 1, grid_pos[1]), RIGHT])
-            if tile_data[DOWN] == DOOR:
-                self.placed_doors.append((grid_pos, DOWN))
-                if not self.grid[(grid_pos[0], grid_pos[1] + 1)]:
+            if door_mask & (1 << DOWN):
+                if self.add_door(grid_index, DOWN, grid_index + self.width, layout_id, bounding_box_offset, record):
                     open_connections.append([(grid_pos[0], grid_pos[1] + 1), UP])
             # Chance to place an item onto the tile. If the tile can't have an item or if it can hold an item but the location is locked
             # or there are no more major items to place, chance will be 0
-            can_tile_have_item: bool = layout[key][4]
-            locks_unlocked: bool = self.is_location_open(layout[key][5]) # Check if item location locks are a subset of opened locks
-            chance = uniform(0,1) * int(can_tile_have_item) * int(locks_unlocked)
+            can_tile_have_item: bool = room.can_have_item[i]
+            locks_unlocked: bool = self.is_location_open(room.item_locks[i]) # Check if item location locks are a subset of opened locks
+            chance = self.rng.uniform(0,1) * int(can_tile_have_item) * int(locks_unlocked)
             if chance >= 0.9 and (len(self.possible_majors) > 0):
                 # Select a random major item to be placed at the tile
-                major = self.possible_majors.pop(randint(0, len(self.possible_majors)-1))
+                major_idx = self.rng.randint(0, len(self.possible_majors)-1)
+                major = self.possible_majors.pop(major_idx)
+                record.majors_taken.append((major_idx, major))
                 self.place_item(major, self.layout_id, bounding_box_offset, grid_pos)
                 placed_key_item = True
             # elif chance >= 0.8 and self.keys_to_place > 0:
@@ -317,112 +651,184 @@ class FloorGenerator:
                 # No item or key was placed
                 tile_info: tuple = (self.layout_id, bounding_box_offset[0], bounding_box_offset[1], grid_pos)
                 self.potential_key_places.add(tile_info)
+                record.key_places.append(tile_info)
         
         # Mark the room as a single tile big dead end if it is one for boss placement later
-        if (len(layout)) == 1:
-            pass
-        if len(layout) == 1 and (int(self.has_door(room["DoorTiles"], RIGHT)) + int(self.has_door(room["DoorTiles"], UP)) + int(self.has_door(room["DoorTiles"], LEFT)) + int(self.has_door(room["DoorTiles"], DOWN)) == 1) and not placed_key_item:
+        if len(room.tiles) == 1 and room.door_directions == 1 and not placed_key_item:
             self.placed_dead_ends.append(draw_begin)
         
         self.layout_id += 1
+        return record
+
+    # Takes a room drawn by draw_room out of the floor again, restoring everything the room changed except the frontier
+    def undo_room(self, record: RoomRecord) -> None:
+        for grid_index in record.cells:
+            self.grid.clear_tile(grid_index)
+        self.empty_cells += len(record.cells)
+        # In reverse order of draw_room: a door that got connected to a later door of the same room is in both lists
+        for key, door in reversed(record.connected_doors):
+            door[3] = None
+            self.open_doors[key] = door
+        for key in record.opened_doors:
+            del self.open_doors[key]
+        del self.room_rows[record.layout_id:]
+        del self.room_doors[record.layout_id:]
+        self.room_graph.truncate(record.layout_id)
+        del self.tiles_with_items[record.tiles_with_items_len:]
+        del self.placed_dead_ends[record.placed_dead_ends_len:]
+        del self.inv[record.inv_len:]
+        while len(self.item_data) > record.item_data_len:
+            self.item_data.popitem()
+        for major_idx, major in reversed(record.majors_taken):
+            self.possible_majors.insert(major_idx, major)
+        self.potential_key_places.difference_update(record.key_places)
+        if record.retired_room is not None:
+            self.retired_rooms.discard(record.retired_room)
+        if record.lock_states != self.possible_lock_states or record.retired_room is not None:
+            self.possible_lock_states = record.lock_states
+            self.possible_rooms_cache.clear()
+            self.weight_tables.clear()
+        self.layout_id = record.layout_id
 
-    # Recursively creates branches of rooms until the grid is fully populated or no more room can be placed
+    # Undoes the last BACKTRACK_ROOMS rooms and puts the frontier back into the state it had before the first of them was placed,
+    # so generate retries that branch. Returns False if the backtrack budget is used up or there is nothing to undo
+    def backtrack(self) -> bool:
+        if self.stats.backtracks >= self.backtrack_budget or len(self.journal) == 0:
+            return False
+        self.stats.backtracks += 1
+        frontier_mark = None
+        for _ in range(min(BACKTRACK_ROOMS, len(self.journal))):
+            record = self.journal.pop()
+            self.undo_room(record)
+            frontier_mark = record.frontier_mark
+            self.stats.rooms_undone += 1
+        self.frontier.rollback(frontier_mark)
+        return True
+
+    # Returns True if there is a single tile dead end without an item that the boss room can go into
+    def has_free_dead_end(self) -> bool:
+        return any(not e in self.tiles_with_items for e in self.placed_dead_ends)
+
+    # Creates branches of rooms until the grid is fully populated or no more room can be placed.
+    # Open connections are kept in self.frontier, the frontier's ordering decides which branch grows next
     def generate(self, grid: dict, next_tile: tuple, door_dir: int, depth: int = 0):
-        global frames, max_recursion_depth_reached
-        open_connections = [[next_tile, door_dir]]
-        open_depths = [depth]
-        while len(open_connections) > 0:
-            frames += 1
-            current_connection = open_connections.pop(0)
-            next_tile = current_connection[0]
-            door_dir = current_connection[1]
-            depth = open_depths.pop(0)
-            max_recursion_depth_reached = max(max_recursion_depth_reached, depth)
-            possible_rooms = self.get_possible_rooms(door_dir, depth)
-            possible_connections = []
+        frontier = self.frontier
+        frontier.push(next_tile, door_dir, depth)
+        while True:
+            self.generate_branches(grid)
+            # A floor without a free single tile dead end has no place for the boss. Retry the last branch if the budget allows it
+            if self.failure_reason is not None or self.has_free_dead_end() or not self.backtrack():
+                break
 
-            for room in possible_rooms:
-                connection_points = room["DoorTiles"][door_dir]
+        self.stats.peak_frontier_size = frontier.peak_size
+        self.stats.duplicate_frontier_targets = frontier.dropped_duplicates
+        self.stats.stale_frontier_entries_skipped = frontier.skipped_stale
+
+    # Places rooms at the frontier's connections until the frontier is empty or the floor can't be finished anymore
+    def generate_branches(self, grid: Grid):
+        frontier = self.frontier
+        stats = self.stats
+        journaling = self.backtrack_budget > 0
+        while len(frontier) > 0:
+            if self.budget_exhausted():
+                return
+            if not self.can_still_place_keys():
+                self.failure_reason = NOT_ENOUGH_KEY_LOCATIONS
+                return
+            stats.frontier_iterations += 1
+            frontier_mark = frontier.mark() if journaling else None
+            next_tile, door_dir, depth = frontier.pop()
+            if depth > stats.max_depth:
+                stats.max_depth = depth
+            # Choose a random room from the list of possible rooms considering their respective weights. Only the drawn room gets validated,
+            # if it doesn't fit it is removed from the table and another room is drawn. This picks from the rooms that fit with the same
+            # probabilities as validating every room first would
+            phase_start = perf_counter()
+            weight_table = self.get_weight_table(door_dir, depth).copy()
+            phase_end = perf_counter()
+            stats.possible_rooms_seconds += phase_end - phase_start
+            room_chosen = None
+            allowed_connections = []
+            while room_chosen is None:
+                phase_start = phase_end
+                room_to_place_idx = weight_table.draw(self.rng.uniform)
+                phase_end = perf_counter()
+                stats.selection_seconds += phase_end - phase_start
+                if room_to_place_idx < 0:
+                    break
+                room = weight_table.items[room_to_place_idx]
                 # Iterate over every transition in the room. If the transition fits next to the one we are at and the room is valid, add it to the possibilities
-                allowed_connections = []
-                for connection in connection_points:
-                    if self.validate_room_position(grid, next_tile, connection, room):
-                        allowed_connections.append(connection)
-                possible_connections.append(allowed_connections)
-            
-            possible_rooms = [r for r in possible_rooms if len(possible_connections[possible_rooms.index(r)]) > 0]
-            possible_connections = [c for c in possible_connections if len(c) > 0]
+                allowed_connections = self.valid_connections(grid, next_tile, room, door_dir)
+                if self.closure_steering and len(allowed_connections) > 0:
+                    allowed_connections = [c for c in allowed_connections if self.leaves_closable_cells(grid, next_tile, c)]
+                phase_start = phase_end
+                phase_end = perf_counter()
+                stats.validation_seconds += phase_end - phase_start
+                stats.candidates_validated += 1
+                if len(allowed_connections) > 0:
+                    room_chosen = room
+                    stats.candidates_accepted += 1
+                else:
+                    weight_table.remove(room_to_place_idx)
+
             # If no room fits, try fitting a dead end next to it to complete the branch
-            if len(possible_rooms) == 0:
+            if room_chosen is None:
                 if grid[next_tile]:
                     continue
-                ends = [e for e in self.dead_ends if self.has_door(e["DoorTiles"], door_dir)]
+                stats.dead_end_fallbacks += 1
+                phase_start = perf_counter()
+                ends = []
                 valid_connections = []
-                for e in ends:
-                    end_connections = []
-                    entrances = e["DoorTiles"][door_dir]
-                    for connection in entrances:
-                        if self.validate_room_position(grid, next_tile, connection, e):
-                            end_connections.append(connection)
-                    valid_connections.append(end_connections)
-                
-                ends = [e for e in ends if len(valid_connections[ends.index(e)]) > 0]
-                valid_connections = [c for c in valid_connections if len(c) > 0]
-                end_to_place_idx = randint(0, len(ends)-1) if len(ends) >= 1 else 0
+                # Single tile dead ends come with their connections, the others still have to be checked on the map
+                for e, end_connections in self.closures[door_dir][grid.facing[next_tile[1] * self.width + next_tile[0]]]:
+                    if end_connections is None:
+                        end_connections = self.valid_connections(grid, next_tile, e, door_dir)
+                    if len(end_connections) > 0:
+                        ends.append(e)
+                        valid_connections.append(end_connections)
+                stats.validation_seconds += perf_counter() - phase_start
+                if len(ends) == 0:
+                    # The branch can't be closed, the door at this connection would lead nowhere. Undo the last rooms and try again
+                    if self.backtrack():
+                        continue
+                    self.failure_reason = NO_DEAD_END_FITS
+                    return
+                end_to_place_idx = self.rng.randint(0, len(ends)-1)
                 end_chosen = ends[end_to_place_idx]
-                end_offset_str = valid_connections[end_to_place_idx][randint(0, len(valid_connections[end_to_place_idx])-1)]
-                end_offset = tuple(map(int, end_offset_str.split(",")))
+                end_offset = valid_connections[end_to_place_idx][self.rng.randint(0, len(valid_connections[end_to_place_idx])-1)].entry
                 draw_begin = (next_tile[0] - end_offset[0], next_tile[1] - end_offset[1])
-                self.draw_room(draw_begin, end_chosen, [])
+                phase_start = perf_counter()
+                record = self.draw_room(draw_begin, end_chosen, [])
+                stats.draw_room_seconds += perf_counter() - phase_start
             else:
-                # Choose a random room from the list of possible rooms considering their respective weights
-                total_weights: float = 0.0
-                for room in possible_rooms:
-                    total_weights += self.room_weight(room, depth)
-                choice = uniform(0, total_weights)
-                room_to_place_idx = 0
-                while (choice > 0):
-                    choice -= self.room_weight(possible_rooms[room_to_place_idx], depth)
-                    room_to_place_idx += 1
-                room_to_place_idx -= 1
-                room_chosen = possible_rooms[room_to_place_idx]
-                room_offset_str = possible_connections[room_to_place_idx][randint(0, len(possible_connections[room_to_place_idx])-1)]
-                room_offset = tuple(map(int, room_offset_str.split(",")))
+                room_offset = allowed_connections[self.rng.randint(0, len(allowed_connections)-1)].entry
                 draw_begin = (next_tile[0] - room_offset[0], next_tile[1] - room_offset[1])
                 new_connections = []
                 # Place the room in the grid
-                self.draw_room(draw_begin, room_chosen, new_connections)
+                phase_start = perf_counter()
+                record = self.draw_room(draw_begin, room_chosen, new_connections)
+                stats.draw_room_seconds += perf_counter() - phase_start
 
                 # If the setting UNIQUE_ROOMS is on, prevent the room from ever being placed again in this generation
-                if UNIQUE_ROOMS and not room_chosen in self.dead_ends:
-                    room_chosen["Scaling"] = 0
-                    room_chosen["Weight"] = 0
+                if UNIQUE_ROOMS and not room_chosen.is_dead_end:
+                    self.retired_rooms.add(room_chosen.index)
+                    record.retired_room = room_chosen.index
+                    self.possible_rooms_cache.clear()
+                    self.weight_tables.clear()
                 
-                # Repeat the same function for every transition without corresponding connection
-                open_connections = new_connections + open_connections
-                open_depths = [depth+1]*len(new_connections) + open_depths
-
-    def move_pos_in_direction(self, pos: tuple, direction: int, units: int = 1) -> tuple:
-        if direction == RIGHT:
-            return (pos[0] + units, pos[1])
-        elif direction == UP:
-            return (pos[0], pos[1] - units)
-        elif direction == LEFT:
-            return (pos[0] - units, pos[1])
-        elif direction == DOWN:
-            return (pos[0], pos[1] + units)
-        else:
-            return pos
-
-    # Calculates the weight of the room, scaling with distance (in rooms) to the start location
-    def room_weight(self, room: dict, depth: int) -> float:
-        if depth < room["Scaling Min"]:
-            scale_amount = 0.0
-        elif depth < room["Scaling Max"] or room["Scaling Max"] == -1:
-            scale_amount = depth
-        else:
-            scale_amount = room["Scaling Max"]
-        return room["Weight"] + room["Scaling"] * scale_amount
+                # Repeat the same function for every transition without corresponding connection. Connections pointing at a tile of the
+                # room itself were added before that tile got drawn, leave them out
+                frontier.push_many([c for c in new_connections if grid.is_empty(c[0])], depth+1)
+
+            if journaling:
+                record.frontier_mark = frontier_mark
+                self.journal.append(record)
+
+    # Calculates the weight of the room, scaling with distance (in rooms) to the start location. Looked up in the room's precomputed weight curve
+    def room_weight(self, room: CompiledRoom, depth: int) -> float:
+        if room.index in self.retired_rooms:
+            return 0.0
+        return room.weight_at(depth)
 
     # Returns list of item lock states that are unlocked by item_id
     def unlocked_states(self, item_id: int, inventory: list) -> int:
@@ -471,77 +877,86 @@ class FloorGenerator:
         if len(locks) == 0: return True
         return any(((self.possible_lock_states & lock) == lock) for lock in locks)
 
-    def get_room_and_transition_data(self) -> dict:
+    # Returns TransitionData and RoomData of the package from the tables draw_room filled
+    def get_room_and_transition_data(self) -> tuple:
         transition_data = {}
-        room_data = []
-
-        for grid_coord, direction in self.placed_doors:
-            tile: Tile = self.grid[grid_coord]
-            outer_key: str = str(tile.layout_id)
-            inner_key: str = f"{tile.bounding_box_offset[0]}_{tile.bounding_box_offset[1]}_{direction}"
-            target_tile_coord: tuple = self.move_pos_in_direction(grid_coord, direction)
-            target_tile: Tile = self.grid[target_tile_coord]
-            value: list = [target_tile.layout_id, target_tile.bounding_box_offset[0], target_tile.bounding_box_offset[1]]
-
-            if not outer_key in transition_data:
-                transition_data[outer_key] = {}
-            transition_data[outer_key][inner_key] = value
-
-            if tile.layout_id >= len(room_data):
-                global_bounding_box_coords = (grid_coord[0] - tile.bounding_box_offset[0], grid_coord[1] - tile.bounding_box_offset[1])
-                room_data.append([tile.room_id, global_bounding_box_coords[0], global_bounding_box_coords[1]])
-
-        for dead_end in self.teleporter_transitions:
-            tile_at_coord: Tile = self.grid[dead_end]
-            outer_key: str = str(tile_at_coord.layout_id)
-            inner_key: str = f"{tile_at_coord.bounding_box_offset[0]}_{tile_at_coord.bounding_box_offset[1]}_{BACK}"
-            target_tile: Tile = self.grid[self.teleporter_transitions[dead_end]]
-            value: list = [target_tile.layout_id, target_tile.bounding_box_offset[0], target_tile.bounding_box_offset[1]]
-
-            if not outer_key in transition_data:
-                transition_data[outer_key] = {}
-            transition_data[outer_key][inner_key] = value
-
-            # Way back
-            outer_key: str = str(target_tile.layout_id)
-            inner_key: str = f"{target_tile.bounding_box_offset[0]}_{target_tile.bounding_box_offset[1]}_{BACK}"
-            value: list = [tile_at_coord.layout_id, tile_at_coord.bounding_box_offset[0], tile_at_coord.bounding_box_offset[1]]
-
-            if not outer_key in transition_data:
-                transition_data[outer_key] = {}
-            transition_data[outer_key][inner_key] = value
-
-        room_data.insert(0, [])
-        return transition_data, room_data
-    
+        for layout_id, doors in enumerate(self.room_doors):
+            if len(doors) == 0:
+                continue
+            transition_data[str(layout_id)] = {f"{x}_{y}_{direction}": target for x, y, direction, target in doors}
+        return transition_data, [[]] + self.room_rows
+
+    # Changes the room id of the tile at pos and of its room's row in RoomData
+    def set_room_id(self, pos: tuple, room_id: int) -> None:
+        tile = self.grid[pos]
+        tile.room_id = room_id
+        self.room_rows[tile.layout_id][0] = room_id
+
+    # Places the boss keys that weren't placed during generation. The last single tile dead end without an item is never used,
+    # it is needed for the boss room
     def place_remaining_boss_keys(self) -> bool:
         if self.keys_to_place == 0: return True # Already placed all keys
         remaining_places = list(self.potential_key_places)
-        shuffle(remaining_places)
+        self.rng.shuffle(remaining_places)
+        free_dead_ends = set(e for e in self.placed_dead_ends if not e in self.tiles_with_items)
         while self.keys_to_place > 0 and len(remaining_places) > 0:
             item_tile: tuple = remaining_places.pop(0)
+            if item_tile[3] in free_dead_ends:
+                if len(free_dead_ends) == 1:
+                    continue
+                free_dead_ends.discard(item_tile[3])
             bb_offset: tuple = (item_tile[1], item_tile[2])
             self.keys_to_place -= 1
             self.place_item(BOSS_KEY, item_tile[0], bb_offset, item_tile[3])
         
         return (self.keys_to_place <= 0)
     
+    # Adds the teleporter doors in both directions between two dead ends
+    def add_teleporter(self, dead_end: tuple, other_end: tuple) -> None:
+        tile = self.grid[dead_end]
+        other_tile = self.grid[other_end]
+        self.room_doors[tile.layout_id].append([tile.bounding_box_offset[0], tile.bounding_box_offset[1], BACK,
+                                                [other_tile.layout_id, other_tile.bounding_box_offset[0], other_tile.bounding_box_offset[1]]])
+        self.room_doors[other_tile.layout_id].append([other_tile.bounding_box_offset[0], other_tile.bounding_box_offset[1], BACK,
+                                                      [tile.layout_id, tile.bounding_box_offset[0], tile.bounding_box_offset[1]]])
+        self.room_graph.connect(tile.layout_id, other_tile.layout_id)
+
+    # Returns the number of rooms between the start and the room at every position
+    def walk_distances(self, positions: list) -> list:
+        distances = self.room_graph.distances()
+        layout_ids = self.grid.layout_ids
+        return [distances[layout_ids[pos[1] * self.width + pos[0]]] for pos in positions]
+
+    # Returns the index of the dead end the boss room goes into
+    def choose_boss_dead_end(self, dead_ends: list) -> int:
+        if self.boss_placement == FARTHEST_DEAD_END:
+            distances = self.walk_distances(dead_ends)
+            return distances.index(max(distances))
+        return self.rng.randint(0, len(dead_ends)-1)
+
+    # Pairs every dead end, in order, with the farthest of the dead ends left and connects the pair with a teleporter by chance
     def place_dead_end_teleporters(self, dead_ends: list) -> None:
         TELEPORT_CHANCE: float = 0.50
-        while len(dead_ends) >= 2:
-            examine_end: tuple = dead_ends.pop(0)
-            furthest_dist: float = 0
-            closest_end_idx: int = 0
-            for i in range(len(dead_ends)):
-                other_end: tuple = dead_ends[i]
-                dist: float = abs(examine_end[0] - other_end[0]) + abs(examine_end[1] - other_end[1])
-                if dist > furthest_dist:
-                    closest_end_idx = i
-                    furthest_dist = dist
-            other_end: tuple = dead_ends.pop(closest_end_idx)
-            if uniform(0.0,1.0) < TELEPORT_CHANCE:
+        if self.teleporter_distance == WALK:
+            points = [self.grid.layout_ids[end[1] * self.width + end[0]] for end in dead_ends]
+            farthest = WalkIndex(self.room_graph, points)
+        else:
+            points = [(end[0] + end[1], end[0] - end[1]) for end in dead_ends]
+            farthest = FarthestIndex(points)
+        for index, examine_end in enumerate(dead_ends):
+            if len(farthest) < 2:
+                break
+            if farthest.removed[index]:
+                continue
+            farthest.remove(index)
+            other_index = farthest.farthest(points[index])
+            farthest.remove(other_index)
+            other_end: tuple = dead_ends[other_index]
+            if self.rng.uniform(0.0,1.0) < TELEPORT_CHANCE:
                 self.teleporter_transitions[examine_end] = other_end
-                print(f"Connected Dead-End at {examine_end} and {other_end} with a Teleporter")
+                self.add_teleporter(examine_end, other_end)
+                if self.log_level >= LOG_INFO:
+                    print(f"Connected Dead-End at {examine_end} and {other_end} with a Teleporter")
             
     
 # START OF MAIN PROGRAM
@@ -553,104 +968,57 @@ if __name__ == "__main__":
         print("Input must be single integer")
         exit(1)
     start_time = time.time()
+    rng = Random()
     if len(sys.argv) > 1:
         try:
-            seed(int(sys.argv[1]))
+            rng.seed(int(sys.argv[1]))
         except ValueError:
             print(f"Cannot convert '{sys.argv[1]}' to int, using random seed")
         except IndexError:
             print(f"No seed given, generating with random seed")
 
 
-    # If we broke out of the generation because of an Exception, repeat until we got a valid floor
+    # If we broke out of the generation because of an Exception, repeat until we got a valid floor or the budgets are used up
     success = False
     KEYS_TO_PLACE: int = int(round(WIDTH/4 - 1))
+    rerolls = 0
+    deadline = None if MAIN_TIME_BUDGET is None else perf_counter() + MAIN_TIME_BUDGET
+    iteration_budget = MAIN_ITERATION_BUDGET
     while not success:
-        frames = 0
-        max_recursion_depth_reached = 0
-        generator = FloorGenerator(WIDTH, HEIGHT, "RoomSets/A2_RoomSet.json", [])
+        generator = FloorGenerator(WIDTH, HEIGHT, "RoomSets/A2_RoomSet.json", [], rng=rng)
+        remaining_time = None if deadline is None else deadline - perf_counter()
         try:
-            success = generator.generate_floor(KEYS_TO_PLACE)
+            success = generator.generate_floor(KEYS_TO_PLACE, remaining_time, iteration_budget)
+            if generator.is_stopped():
+                break
+            if not success:
+                print(f"Floor generation failed ({generator.failure_reason}), rerolling..\n\n\n\n")
         except KeyboardInterrupt:
             exit(1)
         except:
             traceback.print_exc()
             print("Rerolling..\n\n\n\n")
+        if not success:
+            rerolls += 1
+            if iteration_budget is not None:
+                iteration_budget -= generator.stats.frontier_iterations
+    if generator.is_stopped():
+        print(f"Floor generation stopped ({generator.failure_reason}) after {rerolls} rerolls")
+        exit(1)
+    generator.stats.rerolls = rerolls
     
     # Format output
-    prototype_tile = {
-        "color": 0,
-        "corner": 0,
-        "isCorner": False,
-        "special": 0,
-        "wallD": 1,
-        "wallL": 1,
-        "wallU": 1,
-        "wallR": 1,
-        "x": 0,
-        "y": 0
-    }
-
-    map_init_strings = [WIDTH, HEIGHT]
+    export_start = perf_counter()
+    # The mapping tool's tiles
     out = []
-    try:
-        boss_tile = generator.boss_tile
-    except:
-        print("Error: No dead end for boss placement, not setting boss tile")
-        boss_tile = (-1,-1)
-
-    transition_data, room_data = generator.get_room_and_transition_data()
-    tiles_with_teleporters = list(generator.teleporter_transitions.keys()) + list(generator.teleporter_transitions.values())
-    grid = generator.grid
-    for position in grid:
-        if grid[position] != None:
-            map_string = f"{grid[position].u}{grid[position].r}{grid[position].d}{grid[position].l}1"
-            new_tile = deepcopy(prototype_tile)
-            new_tile["wallL"] = grid[position].l
-            new_tile["wallU"] = grid[position].u
-            new_tile["wallD"] = grid[position].d
-            new_tile["wallR"] = grid[position].r
-            new_tile["x"] = position[0] + START[0]
-            new_tile["y"] = position[1] + START[1]
-            if position == generator.start_pos:
-                new_tile["special"] = 1
-                map_string += "1"
-            elif position in generator.tiles_with_items:
-                new_tile["special"] = 3
-                map_string += "3"
-            elif position in tiles_with_teleporters:
-                new_tile["color"] = 1
-                new_tile["special"] = 7
-                map_string = f"{grid[position].u}{grid[position].r}{grid[position].d}{grid[position].l}2"
-                map_string += "7"
-            elif position == boss_tile:
-                new_tile["special"] = 4
-                # Set tile color to purple
-                new_tile["color"] = 3
-                map_string = f"{grid[position].u}{grid[position].r}{grid[position].d}{grid[position].l}4"
-                map_string += "4"
-            else:
-                map_string += "0"
-            map_string += "0"
-            assert len(map_string) == 7
-            out.append(new_tile)
-            map_init_strings.append(map_string)
-        else:
-            map_init_strings.append("0")
-
-    package = {
-        "RoomData": room_data,
-        "TransitionData": transition_data,
-        "MapData": map_init_strings,
-        "ItemData": generator.item_data,
-        "BossData": grid[boss_tile].layout_id
-    }
+    package = export_package(generator, generator.grid[generator.boss_tile].layout_id, out)
 
     with open("PackageTest.json", "w") as file:
         json.dump(package, file)
 
     with open("BranchingOutput.json", "w") as file:
         json.dump(out, file, indent=2)
+    generator.stats.export_seconds = perf_counter() - export_start
 
     # with open("MapDataTest.json", "w") as file:
     #     json.dump(map_init_strings, file)
@@ -659,6 +1027,14 @@ if __name__ == "__main__":
     #     json.dump(transition_data, file, indent=2)
 
     print(f"Execution time: {(time.time() - start_time)}s")
-    print(f"{frames} iterations through generate()")
-    print(f"Maximum Recursion Depth reached: {max_recursion_depth_reached}")
+    stats = generator.stats
+    print(f"Last floor: {stats.total_seconds*1000:.1f}ms generating ({stats.possible_rooms_seconds*1000:.1f}ms room lists, "
+          f"{stats.selection_seconds*1000:.1f}ms selection, {stats.validation_seconds*1000:.1f}ms validation, {stats.draw_room_seconds*1000:.1f}ms drawing), "
+          f"{stats.export_seconds*1000:.1f}ms export, {rerolls} rerolls")
+    print(f"{stats.candidates_accepted} of {stats.candidates_validated} drawn rooms fit, {stats.dead_end_fallbacks} dead end fallbacks")
+    print(f"{generator.stats.frontier_iterations} iterations through generate()")
+    print(f"Maximum Recursion Depth reached: {generator.stats.max_depth}")
+    print(f"get_possible_rooms cache hit rate: {generator.stats.possible_rooms_cache_hit_rate()*100:.1f}%")
+    print(f"Skipped {generator.stats.stale_frontier_entries_skipped} frontier entries whose target was already filled")
+    print(f"Backtracked {generator.stats.backtracks} times, undoing {generator.stats.rooms_undone} rooms")
     print("Done")
\ No newline at end of file
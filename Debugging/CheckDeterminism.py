@@ -0,0 +1,37 @@
+# Checks that a seed produces the same package no matter what else runs in the process. Every seed is generated once on its own
+# and once while all seeds are generated at the same time on a thread pool, then the packages are compared.
+# Usage: python Debugging/CheckDeterminism.py [number of seeds] [width] [height] [threads]
+import contextlib
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from GeneratorClient import generate_seeded_floor, generate_package
+
+ROOM_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RoomSets", "A2_RoomSet.json")
+
+def package_for_seed(seed: int, width: int, height: int, keys: int) -> str:
+    generator, _ = generate_seeded_floor(seed, width, height, keys, [], ROOM_SET_PATH)
+    return json.dumps(generate_package(generator, keys))
+
+if __name__ == "__main__":
+    seeds = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    threads = int(sys.argv[4]) if len(sys.argv) > 4 else 8
+    keys = int(round(width/4 - 1))
+    # Switch threads as often as possible so the generations interleave
+    sys.setswitchinterval(1e-6)
+    with contextlib.redirect_stdout(io.StringIO()):
+        serial = [package_for_seed(seed, width, height, keys) for seed in range(seeds)]
+        with ThreadPoolExecutor(threads) as executor:
+            concurrent = list(executor.map(lambda seed: package_for_seed(seed, width, height, keys), range(seeds)))
+
+    mismatches = [seed for seed in range(seeds) if serial[seed] != concurrent[seed]]
+    for seed in mismatches[:10]:
+        print(f"Seed {seed} produced a different package when generated concurrently")
+    print(f"{seeds} seeds generated on {threads} threads, {len(mismatches)} mismatches")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,87 @@
+# Plays the server for GeneratorClient over the framed protocol and checks that every request gets exactly one answer: a floor,
+# a compact floor, a request cancelled while generating, a request cancelled before the client started on it (generate and cancel
+# arrive together) and a frame of an impossible length, after which the client has to exit.
+# Starts GeneratorClient itself with a fixed seed, so neither the floor pool nor races are used.
+# Usage: python Debugging/CheckFramedProtocol.py [seed]
+import asyncio
+import json
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from GeneratorClient import PORT
+from PackageEncoding import decode_package
+from Protocol import (FRAME_HEADER, FRAME_MAGIC, GENERATE_FLOOR, GENERATE_FLOOR_COMPACT, CANCEL, EXIT, STATUS_OK, STATUS_ERROR,
+                      encode_request, encode_generate_payload)
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANSWER_TIMEOUT: float = 60.0 # Seconds to wait for an answer before the check fails
+
+# Reads one response frame and returns (request id, status, body)
+async def read_response(reader: asyncio.StreamReader) -> tuple:
+    _, length, request_id = FRAME_HEADER.unpack(await asyncio.wait_for(reader.readexactly(FRAME_HEADER.size), ANSWER_TIMEOUT))
+    body = await reader.readexactly(length - 4)
+    return request_id, body[0], body[1:]
+
+async def run_checks(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> list:
+    failures = []
+
+    def expect(name: str, response: tuple, request_id: int, status: int, check_body = None) -> None:
+        if response[0] != request_id or response[1] != status or (check_body is not None and not check_body(response[2])):
+            failures.append(f"{name}: got request {response[0]} with status {response[1]} and body {response[2][:60]!r}")
+        else:
+            print(f"{name}: ok")
+
+    writer.write(encode_request(1, GENERATE_FLOOR, encode_generate_payload(20, 15, 3, [])))
+    await writer.drain()
+    expect("generate", await read_response(reader), 1, STATUS_OK, lambda body: len(json.loads(body)["MapData"]) == 2 + 20 * 15)
+
+    writer.write(encode_request(2, GENERATE_FLOOR_COMPACT, encode_generate_payload(20, 15, 3, [])))
+    await writer.drain()
+    expect("compact generate", await read_response(reader), 2, STATUS_OK, lambda body: len(decode_package(body)["MapData"]) == 2 + 20 * 15)
+
+    writer.write(encode_request(3, GENERATE_FLOOR, encode_generate_payload(74, 57, 18, [])))
+    await writer.drain()
+    await asyncio.sleep(0.05)
+    writer.write(encode_request(3, CANCEL))
+    await writer.drain()
+    expect("cancel while generating", await read_response(reader), 3, STATUS_ERROR, lambda body: body == b"cancelled")
+
+    # Both frames in one write, the client reads the cancel before the generate task ever ran
+    writer.write(encode_request(4, GENERATE_FLOOR, encode_generate_payload(74, 57, 18, [])) + encode_request(4, CANCEL))
+    await writer.drain()
+    expect("cancel before start", await read_response(reader), 4, STATUS_ERROR, lambda body: body == b"cancelled")
+
+    writer.write(FRAME_HEADER.pack(FRAME_MAGIC, 4, 5))
+    await writer.drain()
+    expect("impossible frame length", await read_response(reader), 5, STATUS_ERROR)
+    # The client exits after a broken frame
+    if await asyncio.wait_for(reader.read(), ANSWER_TIMEOUT) != b"":
+        failures.append("client sent more data after the broken frame")
+    return failures
+
+async def main(seed: int) -> int:
+    connected = asyncio.get_running_loop().create_future()
+    server = await asyncio.start_server(lambda reader, writer: connected.set_result((reader, writer)), "127.0.0.1", PORT)
+    client = await asyncio.create_subprocess_exec(sys.executable, os.path.join(REPO_DIRECTORY, "GeneratorClient.py"), str(seed),
+                                                  cwd=REPO_DIRECTORY, stdout=asyncio.subprocess.DEVNULL)
+    try:
+        reader, writer = await asyncio.wait_for(connected, ANSWER_TIMEOUT)
+        failures = await run_checks(reader, writer)
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError) as error:
+        failures = [f"no answer: {error!r}"]
+    finally:
+        if client.returncode is None:
+            try:
+                await asyncio.wait_for(client.wait(), ANSWER_TIMEOUT)
+            except asyncio.TimeoutError:
+                client.kill()
+        server.close()
+    for failure in failures:
+        print(failure)
+    print(f"{len(failures)} checks failed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)))
@@ -0,0 +1,33 @@
+# Checks that the compact binary package encoding round-trips: for generated floors of random sizes, decoding the binary form
+# must give the same package as reading the JSON form.
+# Usage: python Debugging/CheckPackageEncoding.py [number of floors]
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BranchingGeneratorAsClass import LOG_QUIET
+from GeneratorClient import generate_seeded_package
+from PackageEncoding import encode_package, decode_package
+
+ROOM_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RoomSets", "A2_RoomSet.json")
+
+if __name__ == "__main__":
+    floors = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    rng = random.Random(0)
+    mismatches = 0
+    for seed in range(floors):
+        width = rng.randint(4, 74)
+        height = rng.randint(4, 57)
+        keys = rng.randint(0, int(round(width/4 - 1)))
+        with contextlib.redirect_stdout(io.StringIO()):
+            package, _ = generate_seeded_package(seed, width, height, keys, [], ROOM_SET_PATH, LOG_QUIET)
+        expected = json.loads(json.dumps(package))
+        if decode_package(encode_package(package)) != expected:
+            mismatches += 1
+            print(f"Seed {seed} ({width}x{height}, {keys} keys) doesn't round-trip")
+    print(f"{floors} packages checked, {mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
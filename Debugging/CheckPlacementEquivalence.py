@@ -0,0 +1,60 @@
+# Compares the bitboard placement check (validate_room_position) with the tile by tile reference (validate_room_position_reference)
+# on randomized grids, and the memoized check (validate_room_position_memoized) with the reference as well. The grids are
+# generated floors with a random part of their rooms removed again.
+# Usage: python Debugging/CheckPlacementEquivalence.py [number of grids]
+import contextlib
+import io
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BranchingGeneratorAsClass import FloorGenerator
+from PlacementMemo import PlacementMemo
+
+ROOM_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RoomSets", "A2_RoomSet.json")
+
+def random_grid_generator(rng: random.Random) -> FloorGenerator:
+    width = rng.randint(4, 74)
+    height = rng.randint(4, 57)
+    generator = FloorGenerator(width, height, ROOM_SET_PATH, [], rng=random.Random(rng.randint(0, sys.maxsize)))
+    with contextlib.redirect_stdout(io.StringIO()):
+        generator.generate_floor(0)
+    # Punch holes into the floor by removing a random share of its rooms
+    removal_chance = rng.uniform(0.1, 0.9)
+    removed_layouts = {layout_id for layout_id in range(generator.layout_id) if rng.random() < removal_chance}
+    for index in range(width * height):
+        if generator.grid.walls[index] != 0xFF and generator.grid.layout_ids[index] in removed_layouts:
+            generator.grid.clear_tile(index)
+    generator.placement_memo = PlacementMemo(1 << 16)
+    return generator
+
+if __name__ == "__main__":
+    grid_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rng = random.Random(0)
+    checks = 0
+    accepted = 0
+    mismatches = 0
+    for _ in range(grid_count):
+        generator = random_grid_generator(rng)
+        grid = generator.grid
+        for position in grid:
+            if grid[position] != None:
+                continue
+            for room in generator.room_data:
+                for direction in range(4):
+                    for connection in room.connections[direction]:
+                        expected = generator.validate_room_position_reference(grid, position, connection)
+                        actual = generator.validate_room_position(grid, position, connection)
+                        memoized = generator.validate_room_position_memoized(grid, position, connection)
+                        checks += 1
+                        accepted += int(expected)
+                        if expected != actual or expected != memoized:
+                            mismatches += 1
+                            if mismatches <= 10:
+                                print(f"Mismatch for room {room.room_id} door {connection.entry} at {position} on a {generator.width}x{generator.height} grid: "
+                                      f"reference {expected}, bitboard {actual}, memoized {memoized}")
+
+    print(f"{checks} placements checked on {grid_count} grids, {accepted} valid, {mismatches} mismatches")
+    print(f"Placement memo hit rate: {generator.placement_memo.hit_rate() * 100:.1f}% on the last grid")
+    sys.exit(1 if mismatches else 0)
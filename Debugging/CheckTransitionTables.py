@@ -0,0 +1,93 @@
+# Compares the room and transition tables that draw_room keeps up to date against tables rebuilt from the finished grid,
+# for generated floors with backtracking. Every door of the grid must be in the tables with the tile behind it as target,
+# and every room must have its row. The room graph must connect exactly the rooms the doors connect. Also checks that undoing
+# all rooms leaves only the start room behind. Defaults to a small map, where backtracks are common. Fails if no floor backtracked.
+# Usage: python Debugging/CheckTransitionTables.py [number of seeds] [width] [height]
+import contextlib
+import io
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BranchingGeneratorAsClass import FloorGenerator, BACK, DOOR
+from Grid import EMPTY, unpack_wall
+
+ROOM_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RoomSets", "A2_RoomSet.json")
+# Grid index offsets of the neighbour in direction right, up, left, down for a grid of the given width
+def neighbour_offsets(width: int) -> tuple:
+    return (1, -width, -1, width)
+
+# Rebuilds {layout id: {(x, y, direction): target}} and {layout id: row} by walking over the grid
+def rebuild_tables(generator: FloorGenerator) -> tuple:
+    grid = generator.grid
+    offsets = neighbour_offsets(grid.width)
+    doors = {}
+    rows = {}
+    for index in range(grid.width * grid.height):
+        walls = grid.walls[index]
+        if walls == EMPTY:
+            continue
+        layout_id = grid.layout_ids[index]
+        x, y = grid.bounding_box_x[index], grid.bounding_box_y[index]
+        rows[layout_id] = [grid.room_ids[index], index % grid.width - x, index // grid.width - y]
+        for direction in range(4):
+            if unpack_wall(walls, direction) != DOOR:
+                continue
+            target = index + offsets[direction]
+            target_value = None if grid.walls[target] == EMPTY else [grid.layout_ids[target], grid.bounding_box_x[target], grid.bounding_box_y[target]]
+            doors.setdefault(layout_id, {})[(x, y, direction)] = target_value
+    return doors, rows
+
+# Returns the tables of the generator in the same form as rebuild_tables, without the teleporters
+def incremental_tables(generator: FloorGenerator) -> tuple:
+    doors = {}
+    for layout_id, room_doors in enumerate(generator.room_doors):
+        for x, y, direction, target in room_doors:
+            if direction != BACK:
+                doors.setdefault(layout_id, {})[(x, y, direction)] = target
+    rows = {layout_id: row for layout_id, row in enumerate(generator.room_rows)}
+    return doors, rows
+
+# Returns True if the room graph has an edge for every door (and teleporter) between two different rooms and no other edges
+def graph_matches_doors(generator: FloorGenerator) -> bool:
+    for layout_id, room_doors in enumerate(generator.room_doors):
+        expected = sorted(target[0] for _, _, _, target in room_doors if target is not None and target[0] != layout_id)
+        if sorted(generator.room_graph.neighbours[layout_id]) != expected:
+            return False
+    return len(generator.room_graph) == len(generator.room_doors)
+
+if __name__ == "__main__":
+    seeds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    mismatches = 0
+    backtracks = 0
+    for seed in range(seeds):
+        generator = FloorGenerator(width, height, ROOM_SET_PATH, [], rng=random.Random(seed))
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator.generate_floor(int(round(width/4 - 1)))
+        backtracks += generator.stats.backtracks
+        if incremental_tables(generator) != rebuild_tables(generator):
+            mismatches += 1
+            print(f"Seed {seed}: tables differ from the grid")
+            continue
+        if not graph_matches_doors(generator):
+            mismatches += 1
+            print(f"Seed {seed}: room graph differs from the doors")
+            continue
+        open_doors = sum(1 for doors in rebuild_tables(generator)[0].values() for target in doors.values() if target is None)
+        if open_doors != len(generator.open_doors):
+            mismatches += 1
+            print(f"Seed {seed}: {len(generator.open_doors)} open doors recorded, {open_doors} in the grid")
+            continue
+        # Undo everything, only the start room may remain
+        while len(generator.journal) > 0:
+            generator.undo_room(generator.journal.pop())
+        if incremental_tables(generator) != rebuild_tables(generator) or len(generator.room_rows) != 1 or not graph_matches_doors(generator):
+            mismatches += 1
+            print(f"Seed {seed}: tables differ from the grid after undoing all rooms")
+    print(f"{mismatches} of {seeds} floors mismatched, {backtracks} backtracks exercised")
+    if backtracks == 0:
+        print("No floor backtracked, undo_room wasn't checked. Use more seeds or a smaller map")
+    sys.exit(1 if mismatches or backtracks == 0 else 0)
@@ -0,0 +1,73 @@
+# Lists the neighbourhoods of an open connection that no dead end of a room set can close, and the ones only dead ends with more
+# than one tile might close, depending on the cells around them. A floor that runs into one of them has to backtrack or reroll.
+# Also checks the closure table against validate_room_position on a small map.
+# Usage: python Debugging/ReportClosures.py [room set path]
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from BranchingGeneratorAsClass import FloorGenerator
+from Grid import pack_walls
+from RoomSet import load_room_set_json, connection_patterns
+
+ROOM_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RoomSets", "A2_RoomSet.json")
+DIRECTION_NAMES: tuple = ("right", "up", "left", "down")
+WALL_TYPE_NAMES: tuple = ("empty", "wall", "door")
+# Cell in the middle of the check map and the room with doors on every side that the neighbours are cut from
+CHECK_SIZE: int = 5
+CHECK_CELL: tuple = (2, 2)
+
+def describe(pattern: int) -> str:
+    return ", ".join(f"{DIRECTION_NAMES[d]} {WALL_TYPE_NAMES[(pattern >> (d << 1)) & 0b11]}" for d in range(4))
+
+# Puts single tiles around CHECK_CELL that show the wall types of pattern towards it and compares every single tile dead end
+# the closure table lists with validate_room_position. Returns the number of mismatches
+def check_pattern(room_set_path: str, door_dir: int, pattern: int, closures: tuple, dead_ends: list) -> int:
+    generator = FloorGenerator(CHECK_SIZE, CHECK_SIZE, room_set_path, [], rng=random.Random(0))
+    steps = ((1, 0), (0, -1), (-1, 0), (0, 1))
+    for direction, step in enumerate(steps):
+        wall_type = (pattern >> (direction << 1)) & 0b11
+        if wall_type != 0:
+            walls = [0, 0, 0, 0]
+            walls[(direction + 2) & 3] = wall_type
+            index = (CHECK_CELL[1] + step[1]) * CHECK_SIZE + CHECK_CELL[0] + step[0]
+            generator.grid.walls[index] = pack_walls(*walls)
+            generator.grid._add_to_bitboards(index)
+    listed = set(room.index for room, _ in closures)
+    mismatches = 0
+    for room in dead_ends:
+        if len(room.tiles) != 1 or len(room.connections[door_dir]) == 0:
+            continue
+        fits = generator.validate_room_position(generator.grid, CHECK_CELL, room.connections[door_dir][0])
+        if fits != (room.index in listed):
+            print(f"Mismatch for room {room.room_id} with door {DIRECTION_NAMES[door_dir]} at {describe(pattern)}")
+            mismatches += 1
+    return mismatches
+
+if __name__ == "__main__":
+    room_set_path = sys.argv[1] if len(sys.argv) > 1 else ROOM_SET_PATH
+    room_set = load_room_set_json(room_set_path)
+    dead_ends = [room for room in room_set.room_data if room.is_dead_end]
+    print(f"{len(dead_ends)} dead ends: " + ", ".join(f"{room.room_id} ({len(room.tiles)} tiles)" for room in dead_ends))
+
+    unclosable = []
+    larger_only = []
+    mismatches = 0
+    patterns = connection_patterns(room_set.closures)
+    for door_dir, pattern, closures in patterns:
+        if len(closures) == 0:
+            unclosable.append((door_dir, pattern))
+        elif all(connections is None for _, connections in closures):
+            larger_only.append((door_dir, pattern))
+        mismatches += check_pattern(room_set_path, door_dir, pattern, closures, dead_ends)
+
+    print(f"{len(patterns)} neighbourhoods, {len(unclosable)} can't be closed, {len(larger_only)} only by dead ends with more than one tile")
+    for title, entries in (("Can't be closed:", unclosable), ("Only by dead ends with more than one tile:", larger_only)):
+        if len(entries) > 0:
+            print(title)
+        for door_dir, pattern in entries:
+            print(f"  door {DIRECTION_NAMES[door_dir]:>5} needed, neighbours {describe(pattern)}")
+    print(f"{mismatches} mismatches against validate_room_position")
+    if mismatches > 0:
+        sys.exit(1)
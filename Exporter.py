@@ -0,0 +1,99 @@
+from Grid import EMPTY, unpack_wall
+
+START = (3,3) # Coordinate of the top-left corner in the output space of the mapping tool
+
+# What a cell shows on the map, in order of precedence: a cell that is both the start and has an item shows the start
+NORMAL: int = 0
+START_CELL: int = 1
+ITEM_CELL: int = 2
+TELEPORTER_CELL: int = 3
+BOSS_CELL: int = 4
+# Map color and special of every kind of cell in MapData, and the same for the tiles of the mapping tool
+MAP_COLOR: tuple = (1, 1, 1, 2, 4)
+MAP_SPECIAL: tuple = (0, 1, 3, 7, 4)
+TILE_COLOR: tuple = (0, 0, 0, 1, 3)
+TILE_SPECIAL: tuple = (0, 1, 3, 7, 4)
+# Boss room ids by the direction of its door, checked in this order
+BOSS_ROOM_IDS: tuple = (("d", 435), ("l", 436), ("u", 437), ("r", 438))
+
+# MapData strings by packed walls and kind of cell, filled as they come up
+_cell_strings: dict = {}
+
+# Returns the MapData string "urdl" wall types, color, special and a trailing 0 of an occupied cell
+def cell_string(packed_walls: int, kind: int) -> str:
+    key = packed_walls | (kind << 8)
+    cell = _cell_strings.get(key)
+    if cell is None:
+        r, u, l, d = (unpack_wall(packed_walls, direction) for direction in range(4))
+        cell = f"{u}{r}{d}{l}{MAP_COLOR[kind]}{MAP_SPECIAL[kind]}0"
+        _cell_strings[key] = cell
+    return cell
+
+# Replaces the room of the boss tile by the boss room with the door on the same side, like the game expects it
+def set_boss_room(gen) -> None:
+    boss_tile = gen.grid[gen.boss_tile]
+    print(f"Placed boss room in room with ID {boss_tile.room_id}")
+    if boss_tile.room_id in {435, 436, 437, 438}:
+        return
+    for direction, room_id in BOSS_ROOM_IDS:
+        if getattr(boss_tile, direction) == 2: # If tile has door in that direction
+            gen.set_room_id(gen.boss_tile, room_id)
+            print(f"Changed room ID to {room_id}")
+            return
+    print("Room didn't match expected layout, not replacing room ID")
+
+# Returns a bytearray with the kind of every cell of the grid, indexed like the grid's arrays
+def cell_kinds(gen) -> bytearray:
+    grid = gen.grid
+    kinds = bytearray(grid.width * grid.height)
+    # Lowest precedence first, so that the higher ones overwrite it
+    if gen.boss_tile is not None:
+        kinds[grid.index(gen.boss_tile)] = BOSS_CELL
+    for dead_end, other_end in gen.teleporter_transitions.items():
+        kinds[grid.index(dead_end)] = TELEPORTER_CELL
+        kinds[grid.index(other_end)] = TELEPORTER_CELL
+    for position in gen.tiles_with_items:
+        kinds[grid.index(position)] = ITEM_CELL
+    kinds[grid.index(gen.start_pos)] = START_CELL
+    return kinds
+
+# Builds MapData and, if tiles is given, appends the tiles of the mapping tool to it, in a single pass over the grid
+def export_map(gen, tiles: list = None) -> list:
+    grid = gen.grid
+    width = grid.width
+    walls = grid.walls
+    kinds = cell_kinds(gen)
+    map_data = [gen.width, gen.height]
+    for index in range(width * grid.height):
+        packed_walls = walls[index]
+        if packed_walls == EMPTY:
+            map_data.append("0")
+            continue
+        kind = kinds[index]
+        map_data.append(cell_string(packed_walls, kind))
+        if tiles is not None:
+            tiles.append({
+                "color": TILE_COLOR[kind],
+                "corner": 0,
+                "isCorner": False,
+                "special": TILE_SPECIAL[kind],
+                "wallD": unpack_wall(packed_walls, 3),
+                "wallL": unpack_wall(packed_walls, 2),
+                "wallU": unpack_wall(packed_walls, 1),
+                "wallR": unpack_wall(packed_walls, 0),
+                "x": index % width + START[0],
+                "y": index // width + START[1]
+            })
+    return map_data
+
+# Returns the package the game loads. boss_data is the number of boss keys for the game and the boss room's layout id for
+# the mapping tool. If tiles is given, the tiles of the mapping tool are appended to it
+def export_package(gen, boss_data: int, tiles: list = None) -> dict:
+    transition_data, room_data = gen.get_room_and_transition_data()
+    return {
+        "RoomData": room_data,
+        "TransitionData": transition_data,
+        "MapData": export_map(gen, tiles),
+        "ItemData": gen.item_data,
+        "BossData": boss_data
+    }
@@ -0,0 +1,125 @@
+from collections import deque
+
+# Distances the teleporter pairing can use, see FarthestIndex
+MANHATTAN: str = "manhattan" # Distance on the map between the two dead ends, the measure place_dead_end_teleporters always used
+WALK: str = "walk" # Number of rooms you walk through from one dead end to the other, see WalkIndex
+DISTANCES: tuple = (MANHATTAN, WALK)
+
+# Rooms of a floor and the rooms you can walk to from them, indexed by layout id. Rooms are only ever added and removed at the end,
+# which is how the generator draws and undoes them. Distances from the start room are computed on demand and cached until the
+# graph changes
+class RoomGraph:
+    def __init__(self):
+        self.neighbours: list = []
+        self._distances: list = None
+
+    def __len__(self) -> int:
+        return len(self.neighbours)
+
+    def add_room(self) -> None:
+        self.neighbours.append([])
+        self._distances = None
+
+    def connect(self, layout_id: int, other_layout_id: int) -> None:
+        self.neighbours[layout_id].append(other_layout_id)
+        self.neighbours[other_layout_id].append(layout_id)
+        self._distances = None
+
+    # Takes out all rooms from layout_id on. Connections of older rooms to them have to be the last ones of those rooms
+    def truncate(self, layout_id: int) -> None:
+        for room in range(len(self.neighbours) - 1, layout_id - 1, -1):
+            for other_layout_id in reversed(self.neighbours[room]):
+                if other_layout_id < layout_id:
+                    self.neighbours[other_layout_id].pop()
+        del self.neighbours[layout_id:]
+        self._distances = None
+
+    # Returns the number of rooms between the start room (layout id 0) and every room, -1 for rooms that can't be reached
+    def distances(self) -> list:
+        if self._distances is None:
+            self._distances = self.distances_from(0) if len(self.neighbours) > 0 else []
+        return self._distances
+
+    # Returns the number of rooms between the room with layout_id and every room, -1 for rooms that can't be reached. Not cached
+    def distances_from(self, layout_id: int) -> list:
+        distances = [-1] * len(self.neighbours)
+        distances[layout_id] = 0
+        queue = deque([layout_id])
+        while len(queue) > 0:
+            room = queue.popleft()
+            for other in self.neighbours[room]:
+                if distances[other] == -1:
+                    distances[other] = distances[room] + 1
+                    queue.append(other)
+        return distances
+
+# Finds the farthest of a set of points, with points being removed over time. The distance of two points is the largest difference
+# of any of their coordinates, which is the Manhattan distance for points (x + y, x - y) and the plain difference for points with
+# one coordinate. Every point is at an extreme of one coordinate if it is the farthest, so sorting the points once per coordinate
+# and direction answers every query by looking at the first point of each order that wasn't removed yet.
+# Among points at the same distance the one given first wins
+class FarthestIndex:
+    def __init__(self, points: list):
+        self.points: list = points
+        self.removed: bytearray = bytearray(len(points))
+        self.size: int = len(points)
+        # Point indices sorted by ascending and by descending coordinate, ties in point order
+        self.orders: list = []
+        for dimension in range(len(points[0]) if len(points) > 0 else 0):
+            self.orders.append(sorted(range(len(points)), key=lambda i: (points[i][dimension], i)))
+            self.orders.append(sorted(range(len(points)), key=lambda i: (-points[i][dimension], i)))
+        # Position of the first point in every order that may not be removed yet
+        self.heads: list = [0] * len(self.orders)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def remove(self, index: int) -> None:
+        self.removed[index] = 1
+        self.size -= 1
+
+    # Returns the index of the point farthest from point, or None if every point was removed
+    def farthest(self, point: tuple) -> int:
+        best = None
+        best_distance = -1
+        for order_index, order in enumerate(self.orders):
+            head = self.heads[order_index]
+            while head < len(order) and self.removed[order[head]]:
+                head += 1
+            self.heads[order_index] = head
+            if head == len(order):
+                return None
+            candidate = order[head]
+            distance = abs(self.points[candidate][order_index >> 1] - point[order_index >> 1])
+            if distance > best_distance or (distance == best_distance and candidate < best):
+                best = candidate
+                best_distance = distance
+        return best
+
+# Same as FarthestIndex, but for rooms of a RoomGraph, by the number of rooms you walk through between them. Points are layout ids.
+# Every query walks the graph as it is at that time, so connections added in between (like teleporters) count.
+# Among rooms at the same distance the one given first wins, rooms that can't be reached count as the closest
+class WalkIndex:
+    def __init__(self, graph: RoomGraph, points: list):
+        self.graph: RoomGraph = graph
+        self.points: list = points
+        self.removed: bytearray = bytearray(len(points))
+        self.size: int = len(points)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def remove(self, index: int) -> None:
+        self.removed[index] = 1
+        self.size -= 1
+
+    # Returns the index of the point farthest from the room point, or None if every point was removed
+    def farthest(self, point: int) -> int:
+        distances = self.graph.distances_from(point)
+        best = None
+        best_distance = -2
+        for index, other in enumerate(self.points):
+            if not self.removed[index] and distances[other] > best_distance:
+                best = index
+                best_distance = distances[other]
+        return best
@@ -0,0 +1,101 @@
+import asyncio
+import random
+import sys
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+FLOORS_PER_SET: int = 3 # Packages kept ready per parameter set
+MAX_PARAMETER_SETS: int = 8 # Parameter sets the pool keeps packages for, the least recently requested one is evicted beyond that
+
+# Returns the pool key of a generate request
+def pool_key(width: int, height: int, number_of_keys: int, start_inventory: list) -> tuple:
+    return (width, height, number_of_keys, tuple(start_inventory))
+
+# Packages generated ahead of time for the parameter sets (width, height, number_of_keys, start_inventory) the game asks for most.
+# The configured sets are always kept. Every other requested set is learned and kept too, until MAX_PARAMETER_SETS is reached and
+# it is the least recently requested one. refill_forever() generates missing packages on a worker process whenever the pool
+# isn't paused, the client pauses it while it answers a request.
+# generate must be a function generate(seed, width, height, number_of_keys, start_inventory) -> (seed, package, stats) that can run
+# in another process
+class FloorPool:
+    def __init__(self, parameter_sets: list, generate, floors_per_set: int = FLOORS_PER_SET, max_parameter_sets: int = MAX_PARAMETER_SETS):
+        self.generate = generate
+        self.floors_per_set: int = floors_per_set
+        self.max_parameter_sets: int = max(max_parameter_sets, len(parameter_sets))
+        # Ready (seed, package, stats) results per pool key, ordered from least to most recently requested
+        self.floors: OrderedDict = OrderedDict()
+        self.pinned: set = set()
+        for parameter_set in parameter_sets:
+            key = pool_key(*parameter_set)
+            self.pinned.add(key)
+            self.floors[key] = deque()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.executor: ProcessPoolExecutor = ProcessPoolExecutor(1)
+        # Set while the pool may generate, which is while no request holds a pause
+        self.pauses: int = 0
+        self.running: asyncio.Event = asyncio.Event()
+        self.running.set()
+        # Set when a package was taken or a new parameter set was learned
+        self.changed: asyncio.Event = asyncio.Event()
+
+    # Returns a ready (seed, package, stats) for the request, or None if the pool has none
+    def take(self, width: int, height: int, number_of_keys: int, start_inventory: list) -> tuple:
+        key = pool_key(width, height, number_of_keys, start_inventory)
+        if not key in self.floors:
+            self.learn(key)
+            self.misses += 1
+            return None
+        self.floors.move_to_end(key)
+        self.changed.set()
+        if len(self.floors[key]) == 0:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.floors[key].popleft()
+
+    # Starts keeping packages for a new parameter set, evicting the least recently requested set that isn't configured
+    def learn(self, key: tuple) -> None:
+        self.floors[key] = deque()
+        while len(self.floors) > self.max_parameter_sets:
+            evicted = next(k for k in self.floors if not k in self.pinned)
+            del self.floors[evicted]
+            self.evictions += 1
+        self.changed.set()
+
+    # The most recently requested parameter set that is missing packages, or None if the pool is full
+    def next_to_refill(self) -> tuple:
+        for key in reversed(self.floors):
+            if len(self.floors[key]) < self.floors_per_set:
+                return key
+        return None
+
+    # Stops refilling until every pause was matched by a resume
+    def pause(self) -> None:
+        self.pauses += 1
+        self.running.clear()
+
+    def resume(self) -> None:
+        self.pauses -= 1
+        if self.pauses == 0:
+            self.running.set()
+
+    # Refills the pool one package at a time while it isn't paused. Runs until cancelled
+    async def refill_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.running.wait()
+            key = self.next_to_refill()
+            if key is None:
+                self.changed.clear()
+                await self.changed.wait()
+                continue
+            seed = random.randint(0, sys.maxsize)
+            result = await loop.run_in_executor(self.executor, self.generate, seed, key[0], key[1], key[2], list(key[3]))
+            # The set may have been evicted or filled up by now
+            if key in self.floors and len(self.floors[key]) < self.floors_per_set:
+                self.floors[key].append(result)
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
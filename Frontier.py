@@ -0,0 +1,111 @@
+from collections import deque
+
+# Orders in which open connections are taken out of the frontier
+DEPTH_FIRST: str = "depth-first" # Newest connections first, the order generate() always used
+BREADTH_FIRST: str = "breadth-first" # Oldest connections first
+RANDOM: str = "random" # Any connection with the same probability
+ORDERINGS: tuple = (DEPTH_FIRST, BREADTH_FIRST, RANDOM)
+
+# Open connections of the floor that still need a room. An entry is (target, door_dir, depth): target is the empty cell the open door
+# points at, door_dir the direction the new room needs a door in and depth the distance in rooms from the start.
+# Only one entry per target cell is kept, connections to a cell that is already waiting for a room are dropped.
+# When a room gets drawn over a target cell, invalidate() drops the entry pointing at it. Dropped entries stay in the queue until they
+# come up and are skipped there, len() only counts live entries.
+# With journaling on, every change is recorded so that rollback() can return the frontier to an earlier mark()
+class Frontier:
+    def __init__(self, ordering: str = DEPTH_FIRST, randint = None, journaling: bool = False):
+        if not ordering in ORDERINGS:
+            raise ValueError(f"Unknown frontier ordering '{ordering}'")
+        if ordering == RANDOM and randint is None:
+            raise ValueError("Random frontier ordering needs a randint function")
+        self.ordering: str = ordering
+        self.randint = randint
+        # The random ordering swaps the picked entry with the last one, so it uses a list instead of a deque
+        self.entries = [] if ordering == RANDOM else deque()
+        # Live entry for every target cell. An entry in self.entries is stale if it isn't the live entry of its target anymore
+        self.live: dict = {}
+        self.peak_size: int = 0
+        self.dropped_duplicates: int = 0
+        self.skipped_stale: int = 0
+        # Undo journal, a list of ("push", entries), ("pop", entry, index, was_live) and ("invalidate", entry) records
+        self.journal: list = [] if journaling else None
+
+    def __len__(self) -> int:
+        return len(self.live)
+
+    def __contains__(self, target: tuple) -> bool:
+        return target in self.live
+
+    # Adds the connections [(target, door_dir), ...] created by one room. In depth-first order they are taken out again
+    # before everything else and in the order they were given
+    def push_many(self, connections: list, depth: int) -> None:
+        new_entries = []
+        for target, door_dir in connections:
+            if target in self.live:
+                self.dropped_duplicates += 1
+                continue
+            entry = (target, door_dir, depth)
+            self.live[target] = entry
+            new_entries.append(entry)
+        if self.ordering == DEPTH_FIRST:
+            self.entries.extendleft(reversed(new_entries))
+        else:
+            self.entries.extend(new_entries)
+        if self.journal is not None and len(new_entries) > 0:
+            self.journal.append(("push", new_entries))
+        self.peak_size = max(self.peak_size, len(self.live))
+
+    def push(self, target: tuple, door_dir: int, depth: int) -> None:
+        self.push_many([(target, door_dir)], depth)
+
+    # Drops the entry pointing at target because the cell isn't empty anymore
+    def invalidate(self, target: tuple) -> None:
+        entry = self.live.pop(target, None)
+        if self.journal is not None and entry is not None:
+            self.journal.append(("invalidate", entry))
+
+    # Removes and returns the next live entry (target, door_dir, depth). Must not be called on an empty frontier
+    def pop(self) -> tuple:
+        while True:
+            if self.ordering == RANDOM:
+                idx = self.randint(0, len(self.entries)-1)
+                self.entries[idx], self.entries[-1] = self.entries[-1], self.entries[idx]
+                entry = self.entries.pop()
+            else:
+                idx = 0
+                entry = self.entries.popleft()
+            was_live = self.live.get(entry[0]) is entry
+            if self.journal is not None:
+                self.journal.append(("pop", entry, idx, was_live))
+            if was_live:
+                del self.live[entry[0]]
+                return entry
+            self.skipped_stale += 1
+
+    # Returns a mark of the frontier's current state for rollback(). Only works with journaling on
+    def mark(self) -> int:
+        return len(self.journal)
+
+    # Undoes every change made since mark was taken
+    def rollback(self, mark: int) -> None:
+        while len(self.journal) > mark:
+            record = self.journal.pop()
+            if record[0] == "push":
+                for entry in record[1]:
+                    if self.ordering == DEPTH_FIRST:
+                        self.entries.popleft()
+                    else:
+                        self.entries.pop()
+                    del self.live[entry[0]]
+            elif record[0] == "pop":
+                entry, idx, was_live = record[1], record[2], record[3]
+                if self.ordering == RANDOM:
+                    self.entries.append(entry)
+                    self.entries[idx], self.entries[-1] = self.entries[-1], self.entries[idx]
+                else:
+                    self.entries.appendleft(entry)
+                if was_live:
+                    self.live[entry[0]] = entry
+            else:
+                entry = record[1]
+                self.live[entry[0]] = entry
@@ -1,130 +1,376 @@
 import asyncio
+import contextlib
+import functools
 import json
+import multiprocessing
+import os
 import random
 import sys
 import random
-from BranchingGeneratorAsClass import Tile, FloorGenerator
+import time
+from BranchingGeneratorAsClass import FloorGenerator, LOG_LEVEL, LOG_QUIET, CANCELLED, TIME_BUDGET_EXCEEDED
+from FloorPool import FloorPool
+from Profiling import profile_call
+from Protocol import Message, ProtocolError, read_message, encode_response, parse_generate_payload, EXIT, STATUS_OK, STATUS_ERROR, GENERATE_FLOOR_COMPACT
+from PackageEncoding import encode_package
+from Exporter import export_package, set_boss_room
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
 
 PORT: int = 64196
+ROOM_SET_PATH: str = "RoomSets/A2_RoomSet.json"
+RACE_SEEDS: int = min(4, os.cpu_count() or 1) # Number of seeds generated in parallel per request, the first finished floor is delivered. 1 turns racing off
+# Seconds after which a race without a finished floor is stopped and its framed request answered with an error. None waits forever.
+# The legacy protocol can't report errors, legacy commands always wait for their race to finish
+RACE_DEADLINE: float = 5.0
+# Parameter sets (width, height, number_of_keys, start_inventory) that packages are generated for ahead of time. Other requested sets
+# are learned by the pool on their first request. An empty list and no learned sets turns the pool off
+POOL_PARAMETER_SETS: list = [(74, 57, 18, [])]
+USE_FLOOR_POOL: bool = True
+GENERATION_WORKERS: int = os.cpu_count() or 1 # Worker processes for generate commands that aren't raced
+PROFILE_MODE: str = None # "cprofile" or "sampling" profiles every generate command in this process, see Profiling.py. Set with --profile
+PROFILE_DIRECTORY: str = "Profiles"
+REQUEST_TIME_BUDGET: float = None # Seconds a framed generate command may take before it is answered with an error. None waits forever
+STATS_LOG_PATH: str = None # If set, the GenerationStats of every delivered floor are appended to this file as one JSON line per request
 exit: bool = False
 seed: int = -1
 preset_seed: bool = False
+# Id of the race the worker processes should work on. Workers of an older race stop within a few frontier iterations
+current_race = None
 
+# Builds the package the game reads. The time it takes is stored in gen.stats.export_seconds
 def generate_package(gen: FloorGenerator, n_boss_keys: int = 0) -> dict:
-    full_data: dict = {}
-    boss_tile_obj: Tile = gen.grid[gen.boss_tile]
-    print(f"Placed boss room in room with ID {boss_tile_obj.room_id}")
-    if not boss_tile_obj.room_id in {435, 436, 437, 438}:
-        if boss_tile_obj.d == 2: # If tile has door down
-            boss_tile_obj.room_id = 435
-            print("Changed room ID to 435")
-        elif boss_tile_obj.l == 2:
-            boss_tile_obj.room_id = 436
-            print("Changed room ID to 436")
-        elif boss_tile_obj.u == 2:
-            boss_tile_obj.room_id = 437
-            print("Changed room ID to 437")
-        elif boss_tile_obj.r == 2:
-            boss_tile_obj.room_id = 438
-            print("Changed room ID to 438")
-        else:
-            print("Room didn't match expected layout, not replacing room ID")
-    
-    transition_data, room_data = gen.get_room_and_transition_data()
-    map_init_strings = [gen.width, gen.height]
-    teleporter_coords: list = list(gen.teleporter_transitions.keys()) + list(gen.teleporter_transitions.values())
-
-    for coord in gen.grid:
-        if gen.grid[coord] != None:
-            map_string = f"{gen.grid[coord].u}{gen.grid[coord].r}{gen.grid[coord].d}{gen.grid[coord].l}1"
-            if coord == gen.start_pos:
-                map_string += "1"
-            elif coord in gen.tiles_with_items:
-                map_string += "3"
-            elif coord in teleporter_coords:
-                map_string = f"{gen.grid[coord].u}{gen.grid[coord].r}{gen.grid[coord].d}{gen.grid[coord].l}2"
-                map_string += "7"
-            elif coord == gen.boss_tile:
-                # Set tile color to purple
-                map_string = f"{gen.grid[coord].u}{gen.grid[coord].r}{gen.grid[coord].d}{gen.grid[coord].l}4"
-                map_string += "4"
+    start_time = time.perf_counter()
+    set_boss_room(gen)
+    package = export_package(gen, n_boss_keys)
+    gen.stats.export_seconds = time.perf_counter() - start_time
+    return package
+
+# Raised when a generation was stopped by its budget or cancel token before it produced a floor
+class GenerationStopped(Exception):
+    # The arguments go to Exception as they are, so that the exception can be sent back from a worker process
+    def __init__(self, seed: int, reason: str):
+        super().__init__(seed, reason)
+        self.seed: int = seed
+        self.reason: str = reason
+
+    def __str__(self) -> str:
+        if self.seed is None:
+            return f"Generation stopped: {self.reason}"
+        return f"Generation of seed {self.seed} stopped: {self.reason}"
+
+# Generates with a random.Random seeded with seed and rerolls until a floor generates successfully, the same way for every caller so
+# that a seed always produces the same floor. Returns the generator of the successful floor and the number of attempts it took.
+# time_budget (seconds), iteration_budget (frontier iterations) and cancel_token hold for all attempts together, see
+# FloorGenerator.generate_floor. If one of them stops the generation, the stopped generator is returned, its failure_reason tells why
+def generate_seeded_floor(seed: int, floor_width: int, floor_height: int, number_of_keys: int, start_inventory: list,
+                          room_set_path: str = ROOM_SET_PATH, log_level: int = LOG_LEVEL, time_budget: float = None,
+                          iteration_budget: int = None, cancel_token = None) -> tuple:
+    rng = random.Random(seed)
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    success: bool = False
+    generator: FloorGenerator = None
+    attempts: int = 0
+    while not success:
+        attempts += 1
+        generator = FloorGenerator(floor_width, floor_height, room_set_path, deepcopy(start_inventory), rng=rng, log_level=log_level)
+        remaining_time = None if deadline is None else deadline - time.perf_counter()
+        success = generator.generate_floor(number_of_keys, remaining_time, iteration_budget, cancel_token)
+        if generator.is_stopped():
+            if log_level > LOG_QUIET: print(f"Floor generation stopped ({generator.failure_reason})")
+            break
+        if not success and log_level > LOG_QUIET: print(f"Floor generation failed ({generator.failure_reason}), trying again..\n\n")
+        if iteration_budget is not None:
+            iteration_budget -= generator.stats.frontier_iterations
+    generator.stats.rerolls = attempts - 1
+    return generator, attempts
+
+# Generates the floor of a seed and turns it into a package. Returns (package, stats). Raises GenerationStopped if the budget
+# ran out or cancel_token was set
+def generate_seeded_package(seed: int, floor_width: int, floor_height: int, number_of_keys: int, start_inventory: list,
+                            room_set_path: str = ROOM_SET_PATH, log_level: int = LOG_LEVEL, time_budget: float = None,
+                            cancel_token = None) -> tuple:
+    generator, _ = generate_seeded_floor(seed, floor_width, floor_height, number_of_keys, start_inventory, room_set_path, log_level,
+                                         time_budget, cancel_token=cancel_token)
+    if generator.is_stopped():
+        raise GenerationStopped(seed, generator.failure_reason)
+    return generate_package(generator, number_of_keys), generator.stats.as_dict()
+
+# generate_seeded_package under the profiler of the given mode. The profile files are named after the seed and parameters
+# and written to directory together with a JSON file that has everything needed to generate the floor again
+def profile_seeded_package(mode: str, directory: str, seed: int, floor_width: int, floor_height: int, number_of_keys: int,
+                           start_inventory: list, room_set_path: str = ROOM_SET_PATH, log_level: int = LOG_LEVEL) -> tuple:
+    output_base = os.path.join(directory, f"seed{seed}_{floor_width}x{floor_height}_{number_of_keys}keys")
+    metadata = {
+        "Seed": seed,
+        "Width": floor_width,
+        "Height": floor_height,
+        "Keys": number_of_keys,
+        "StartInventory": start_inventory
+    }
+    return profile_call(mode, output_base, metadata, generate_seeded_package, seed, floor_width, floor_height, number_of_keys,
+                        start_inventory, room_set_path, log_level)
+
+# Generates the package of a seed in the floor pool's worker process. Returns (seed, package, stats)
+def pool_floor(seed: int, floor_width: int, floor_height: int, number_of_keys: int, start_inventory: list) -> tuple:
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        generator, _ = generate_seeded_floor(seed, floor_width, floor_height, number_of_keys, start_inventory, log_level=LOG_QUIET)
+        return seed, generate_package(generator, number_of_keys), generator.stats.as_dict()
+
+# Runs in the race worker processes, stores the shared race id
+def init_race_worker(race) -> None:
+    global current_race
+    current_race = race
+
+# Cancel token of one seed of a race, set as soon as the race is over
+class RaceToken:
+    def __init__(self, race_id: int):
+        self.race_id: int = race_id
+
+    def is_set(self) -> bool:
+        return current_race.value != self.race_id
+
+# Generates the floor for one seed of a race in a worker process. Returns (seed, package, stats), or (seed, None, None) if
+# another seed of the race finished first
+def race_seed(race_id: int, seed: int, floor_width: int, floor_height: int, number_of_keys: int, start_inventory: list) -> tuple:
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        generator, _ = generate_seeded_floor(seed, floor_width, floor_height, number_of_keys, start_inventory,
+                                             log_level=LOG_QUIET, cancel_token=RaceToken(race_id))
+        if generator.is_stopped():
+            return seed, None, None
+        return seed, generate_package(generator, number_of_keys), generator.stats.as_dict()
+
+# Generates RACE_SEEDS seeds at the same time and returns (seed, package, stats) of the first one that finishes. The other seeds are
+# cancelled. Raises GenerationStopped if no seed finished within time_limit seconds
+async def race_for_package(executor: ProcessPoolExecutor, race, floor_width: int, floor_height: int, number_of_keys: int, start_inventory: list,
+                           time_limit: float = None) -> tuple:
+    loop = asyncio.get_running_loop()
+    with race.get_lock():
+        race.value += 1
+        race_id = race.value
+    seeds = [random.randint(0, sys.maxsize) for _ in range(RACE_SEEDS)]
+    print(f"Racing seeds {seeds}")
+    futures = [loop.run_in_executor(executor, race_seed, race_id, s, floor_width, floor_height, number_of_keys, start_inventory) for s in seeds]
+    pending = set(futures)
+    deadline = None if time_limit is None else loop.time() + time_limit
+    try:
+        while len(pending) > 0:
+            timeout = None if deadline is None else max(0, deadline - loop.time())
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if len(done) == 0:
+                print(f"No floor finished within {time_limit}s, giving up")
+                raise GenerationStopped(None, TIME_BUDGET_EXCEEDED)
+            for future in done:
+                if future.result()[1] is not None:
+                    return future.result()
+        # Racers only come back without a floor once the race is over
+        raise GenerationStopped(None, CANCELLED)
+    finally:
+        # Tell the remaining workers to stop, also if the request was cancelled. They notice within a few frontier iterations
+        # and return without a package
+        with race.get_lock():
+            race.value += 1
+        for future in pending:
+            future.cancel()
+
+# Appends the stats of one delivered floor to the JSON lines file at path
+def write_stats_line(path: str, seed: int, floor_width: int, floor_height: int, number_of_keys: int, start_inventory: list,
+                     from_pool: bool, stats: dict) -> None:
+    line = {
+        "Seed": seed,
+        "Width": floor_width,
+        "Height": floor_height,
+        "Keys": number_of_keys,
+        "StartInventory": start_inventory,
+        "FromPool": from_pool,
+        "Stats": stats
+    }
+    with open(path, "a") as file:
+        file.write(json.dumps(line) + "\n")
+
+# Produces the packages for generate commands, from the floor pool, a race or a single seed on a worker process.
+# Several commands can be produced at the same time
+class PackageProducer:
+    def __init__(self):
+        self.race_executor: ProcessPoolExecutor = None
+        self.race = None
+        # Races use all race workers, so only one runs at a time
+        self.race_lock: asyncio.Lock = asyncio.Lock()
+        if RACE_SEEDS > 1 and not preset_seed:
+            self.race = multiprocessing.Value("q", 0)
+            self.race_executor = ProcessPoolExecutor(RACE_SEEDS, initializer=init_race_worker, initargs=(self.race,))
+        # Generates single seeds without blocking the event loop
+        self.executor: ProcessPoolExecutor = ProcessPoolExecutor(GENERATION_WORKERS)
+        # Hands out the cancel tokens of the generations in self.executor
+        self.manager = None
+        if PROFILE_MODE is None:
+            self.manager = multiprocessing.Manager()
+        self.pool: FloorPool = None
+        self.refill_task: asyncio.Task = None
+        if USE_FLOOR_POOL and not preset_seed:
+            # Fills up while the client waits for the next command
+            self.pool = FloorPool(POOL_PARAMETER_SETS, pool_floor)
+            self.refill_task = asyncio.create_task(self.pool.refill_forever())
+
+    # Returns (seed, package, stats, from_pool) for a generate command. A race that takes longer than race_deadline seconds raises
+    # GenerationStopped
+    async def produce(self, floor_width: int, floor_height: int, number_of_keys: int, start_inventory: list, race_deadline: float = None) -> tuple:
+        if self.pool is not None:
+            self.pool.pause()
+        try:
+            # A profiled command always generates in this process, the sampling profiler only works in the main thread
+            if self.pool is not None and PROFILE_MODE is None:
+                pooled = self.pool.take(floor_width, floor_height, number_of_keys, start_inventory)
+                if pooled is not None:
+                    print(f"Generated with seed {pooled[0]} (from pool)")
+                    return pooled + (True,)
+            if self.race_executor is not None and PROFILE_MODE is None:
+                async with self.race_lock:
+                    floor_seed, package, stats = await race_for_package(self.race_executor, self.race, floor_width, floor_height, number_of_keys,
+                                                                         start_inventory, race_deadline)
+                print(f"Generated with seed {floor_seed}")
+                return floor_seed, package, stats, False
+            floor_seed = seed if preset_seed else random.randint(0, sys.maxsize)
+            print(f"Generating with seed {floor_seed}")
+            if PROFILE_MODE is not None:
+                package, stats = profile_seeded_package(PROFILE_MODE, PROFILE_DIRECTORY, floor_seed, floor_width, floor_height, number_of_keys, start_inventory)
             else:
-                map_string += "0"
-            map_string += "0"
-            map_init_strings.append(map_string)
-        else:
-            map_init_strings.append("0")
-    
-    full_data["RoomData"] = room_data
-    full_data["TransitionData"] = transition_data
-    full_data["MapData"] = map_init_strings
-    full_data["ItemData"] = gen.item_data
-    full_data["BossData"] = n_boss_keys
-
-    return full_data
-
-def merge_bytes_to_int(a: int, b: int) -> int:
-    return (a << 8) + b
+                loop = asyncio.get_running_loop()
+                cancel_token = self.manager.Event()
+                try:
+                    package, stats = await loop.run_in_executor(self.executor, generate_seeded_package, floor_seed, floor_width, floor_height,
+                                                                number_of_keys, start_inventory, ROOM_SET_PATH, LOG_LEVEL, None, cancel_token)
+                except asyncio.CancelledError:
+                    # The worker process keeps going on its own, stop it so that it is free for the next command
+                    cancel_token.set()
+                    raise
+            return floor_seed, package, stats, False
+        finally:
+            if self.pool is not None:
+                self.pool.resume()
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+        if self.manager is not None:
+            self.manager.shutdown()
+        if self.race_executor is not None:
+            self.race_executor.shutdown(cancel_futures=True)
+        if self.pool is not None:
+            self.refill_task.cancel()
+            self.pool.close()
+            print(f"Floor pool: {self.pool.hits} hits, {self.pool.misses} misses, {self.pool.evictions} evicted parameter sets")
+
+# Produces the package for a generate command and returns it as JSON, or in the compact binary encoding. Raises GenerationStopped if
+# a race takes longer than race_deadline seconds
+async def generate_command(producer: PackageProducer, payload: bytes, compact: bool = False, race_deadline: float = None) -> bytes:
+    floor_width, floor_height, number_of_keys, start_inventory = parse_generate_payload(payload)
+    print(f"Start Inventory = {start_inventory}")
+    floor_seed, package, stats, from_pool = await producer.produce(floor_width, floor_height, number_of_keys, start_inventory, race_deadline)
+    if STATS_LOG_PATH is not None:
+        write_stats_line(STATS_LOG_PATH, floor_seed, floor_width, floor_height, number_of_keys, start_inventory, from_pool, stats)
+    if compact:
+        return encode_package(package)
+    return json.dumps(package).encode()
+
+# Answers a framed generate command. Runs as its own task so that other commands can be read in the meantime. A request that
+# takes longer than REQUEST_TIME_BUDGET or whose race runs out of RACE_DEADLINE is answered with an error. A request the server
+# cancels is answered by answer_cancelled
+async def answer_framed_generate(producer: PackageProducer, writer: asyncio.StreamWriter, message: Message) -> None:
+    try:
+        compact = message.command_type == GENERATE_FLOOR_COMPACT
+        body = await asyncio.wait_for(generate_command(producer, message.payload, compact, RACE_DEADLINE), REQUEST_TIME_BUDGET)
+        response = encode_response(message.request_id, STATUS_OK, body)
+    except GenerationStopped as error:
+        print(f"Request {message.request_id} failed: {error}")
+        response = encode_response(message.request_id, STATUS_ERROR, error.reason.encode())
+    except TimeoutError:
+        print(f"Request {message.request_id} took longer than {REQUEST_TIME_BUDGET}s")
+        response = encode_response(message.request_id, STATUS_ERROR, TIME_BUDGET_EXCEEDED.encode())
+    except Exception as error:
+        print(f"Request {message.request_id} failed: {error!r}")
+        response = encode_response(message.request_id, STATUS_ERROR, str(error).encode())
+    writer.write(response)
+    try:
+        await writer.drain()
+    except asyncio.CancelledError:
+        # The request is answered already, a cancel that arrives now must not answer it a second time
+        pass
+    print(f"\nWrote response to request {message.request_id} to Server")
+
+# Done callback of an answer_framed_generate task. A task that gets cancelled before it ran never gets to answer on its own, so
+# every cancelled request is answered from here
+def answer_cancelled(writer: asyncio.StreamWriter, request_id: int, task: asyncio.Task) -> None:
+    if task.cancelled():
+        print(f"Request {request_id} cancelled")
+        writer.write(encode_response(request_id, STATUS_ERROR, CANCELLED.encode()))
 
 async def main():
-    global exit, seed
+    global exit
     reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
     print("Connected to Server")
+    producer = PackageProducer()
+    # Framed generate commands that are still being answered, by request id
+    requests_in_flight: dict = {}
     while not exit:
         try:
-            command = await reader.readuntil(b"#")
-            command_type = command[0]
-            print(f"Command =", end=" ")
-            for b in command:
+            message = await read_message(reader)
+            print(f"Command{f' (request {message.request_id})' if message.framed else ''} =", end=" ")
+            for b in message.legacy_bytes():
                 print(b, end=" ")
             print("")
         except asyncio.IncompleteReadError:
             print("Server closed, exiting")
-            command = ""
-            command_type = 2
-        match command_type:
+            message = Message(False, None, EXIT, b"")
+        except ProtocolError as error:
+            # The rest of the stream can't be read anymore. Answer the broken frame, finish the requests in flight and exit
+            print(f"Received malformed frame (request {error.request_id}): {error}, exiting")
+            writer.write(encode_response(error.request_id, STATUS_ERROR, str(error).encode()))
+            await writer.drain()
+            message = Message(False, None, EXIT, b"")
+        match message.command_type:
+            case 1 | 3 if message.framed: # Generate Floor, 3 answers with the compact package
+                task = asyncio.create_task(answer_framed_generate(producer, writer, message))
+                requests_in_flight[message.request_id] = task
+                task.add_done_callback(lambda _, request_id=message.request_id: requests_in_flight.pop(request_id, None))
+                task.add_done_callback(functools.partial(answer_cancelled, writer, message.request_id))
             case 1: # Generate Floor
-                floor_width: int = int(command[1])
-                floor_height: int = int(command[2])
-                number_of_keys: int = int(command[3])
-                start_inventory: list = []
-                i: int = 4
-                while i < len(command)-2:
-                    start_inventory.append(merge_bytes_to_int(command[i+1], command[i]))
-                    i += 2
-                if not preset_seed:
-                    seed = random.randint(0, sys.maxsize)
-                    random.seed(seed)
-                    print(f"Generating with seed {seed}")
-                print(f"Start Inventory = {start_inventory}")
-                success: bool = False
-                generator: FloorGenerator = None
-                while not success:
-                    generator = FloorGenerator(floor_width, floor_height, "RoomSets/A2_RoomSet.json", deepcopy(start_inventory))
-                    success = generator.generate_floor(number_of_keys)
-                    if not success: print("Floor generation failed, trying again..\n\n")
-                package: dict = generate_package(generator, number_of_keys)
-                package_string: str = json.dumps(package)
-                writer.write(package_string.encode())
+                # The legacy protocol can't tell responses apart, answer before reading the next command
+                writer.write(await generate_command(producer, message.payload))
                 await writer.drain()
                 print("\nWrote Package Data to Server")
             case 2:
                 exit = True
+            case 4 if message.framed: # Cancel, the cancelled request is answered with an error response
+                task = requests_in_flight.get(message.request_id)
+                if task is not None:
+                    task.cancel()
             case _:
-                print(f"Received unknown command_type {command_type}")
-    
+                print(f"Received unknown command_type {message.command_type}")
+                if message.framed:
+                    writer.write(encode_response(message.request_id, STATUS_ERROR, f"Unknown command type {message.command_type}".encode()))
+                    await writer.drain()
+
+    if len(requests_in_flight) > 0:
+        await asyncio.gather(*requests_in_flight.values(), return_exceptions=True)
+    producer.close()
     writer.close()
     await writer.wait_closed()
     print("Socket closed")
 
-try:
-    seed = int(sys.argv[1])
-    preset_seed = True
-except ValueError:
-    print(f"Could not convert '{sys.argv[1]}' to integer, using random seed")
-    seed = random.randint(0, sys.maxsize)
-except:
-    seed = random.randint(0, sys.maxsize)
+if __name__ == "__main__":
+    # python GeneratorClient.py [seed] [--profile cprofile|sampling]
+    if "--profile" in sys.argv:
+        profile_index = sys.argv.index("--profile")
+        PROFILE_MODE = sys.argv[profile_index + 1] if profile_index + 1 < len(sys.argv) else "sampling"
+        del sys.argv[profile_index:profile_index + 2]
+        print(f"Profiling every generate command with {PROFILE_MODE}, writing to {PROFILE_DIRECTORY}")
+    try:
+        seed = int(sys.argv[1])
+        preset_seed = True
+    except ValueError:
+        print(f"Could not convert '{sys.argv[1]}' to integer, using random seed")
+        seed = random.randint(0, sys.maxsize)
+    except:
+        seed = random.randint(0, sys.maxsize)
 
-asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
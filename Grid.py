@@ -0,0 +1,222 @@
+from array import array
+
+# Value of the packed wall byte of a cell that doesn't hold a tile
+EMPTY: int = 0xFF
+
+# Wall types, same values as in the generator
+WALL: int = 1
+DOOR: int = 2
+
+# Packs the wall types of a tile (2 bits each, in direction order right, up, left, down) into a single byte
+def pack_walls(r: int, u: int, l: int, d: int) -> int:
+    return r | (u << 2) | (l << 4) | (d << 6)
+
+# Returns the wall type of a packed wall byte in the given direction
+def unpack_wall(walls: int, direction: int) -> int:
+    return (walls >> (direction << 1)) & 0b11
+
+# Read/write view of a single cell of a Grid. Behaves like the Tile that used to be stored in the grid dict
+class TileView:
+    __slots__ = ("grid", "index")
+
+    def __init__(self, grid, index: int):
+        self.grid = grid
+        self.index = index
+
+    def _get_wall(self, direction: int) -> int:
+        return unpack_wall(self.grid.walls[self.index], direction)
+
+    def _set_wall(self, direction: int, value: int) -> None:
+        shift = direction << 1
+        self.grid.set_walls(self.index, (self.grid.walls[self.index] & ~(0b11 << shift) & 0xFF) | (value << shift))
+
+    r = property(lambda self: self._get_wall(0), lambda self, value: self._set_wall(0, value))
+    u = property(lambda self: self._get_wall(1), lambda self, value: self._set_wall(1, value))
+    l = property(lambda self: self._get_wall(2), lambda self, value: self._set_wall(2, value))
+    d = property(lambda self: self._get_wall(3), lambda self, value: self._set_wall(3, value))
+
+    @property
+    def room_id(self) -> int:
+        return self.grid.room_ids[self.index]
+
+    @room_id.setter
+    def room_id(self, value: int) -> None:
+        self.grid.room_ids[self.index] = value
+
+    @property
+    def layout_id(self) -> int:
+        return self.grid.layout_ids[self.index]
+
+    @layout_id.setter
+    def layout_id(self, value: int) -> None:
+        self.grid.layout_ids[self.index] = value
+
+    @property
+    def bounding_box_offset(self) -> tuple:
+        return (self.grid.bounding_box_x[self.index], self.grid.bounding_box_y[self.index])
+
+    @bounding_box_offset.setter
+    def bounding_box_offset(self, value: tuple) -> None:
+        self.grid.bounding_box_x[self.index] = value[0]
+        self.grid.bounding_box_y[self.index] = value[1]
+
+# Bitboards of a room for one bitboard stride. Bits are laid out like the grid's bitboards, relative to the room's bounding box origin.
+# door[n] has a bit for every tile with a door in direction n, wall[n] for every tile with a wall in direction n
+class RoomMasks:
+    __slots__ = ("occupancy", "door", "wall")
+
+    def __init__(self, room, stride: int):
+        self.occupancy = 0
+        self.door = [0, 0, 0, 0]
+        self.wall = [0, 0, 0, 0]
+        for i, offset in enumerate(room.bounding_box_offsets):
+            bit = 1 << (offset[1] * stride + offset[0])
+            self.occupancy |= bit
+            for direction in range(4):
+                if room.walls[i][direction] == DOOR:
+                    self.door[direction] |= bit
+                elif room.walls[i][direction] == WALL:
+                    self.wall[direction] |= bit
+
+# Returns the RoomMasks of a compiled room for the given stride. Masks are cached on the room because they only depend on the stride
+def room_masks(room, stride: int) -> RoomMasks:
+    masks = room.masks.get(stride)
+    if masks is None:
+        masks = RoomMasks(room, stride)
+        room.masks[stride] = masks
+    return masks
+
+# Grid of tiles stored in flat arrays, indexed by y * width + x.
+# Supports the same (x,y) indexing as the old {(x,y): Tile or None} dict, reading a cell returns a TileView or None.
+# Additionally keeps integer bitboards of the grid: one for occupied cells and one per direction for doors and for walls.
+# The bitboards have a border of one cell around the map (cell (x,y) is bit (y+1) * stride + x + 1) that counts as a wall on every side,
+# so doors pointing out of the map hit a wall
+class Grid:
+    def __init__(self, width: int, height: int):
+        self.width: int = width
+        self.height: int = height
+        size = width * height
+        self.walls: bytearray = bytearray([EMPTY]) * size
+        self.room_ids: array = array("H", bytes(2 * size))
+        self.layout_ids: array = array("H", bytes(2 * size))
+        self.bounding_box_x: array = array("b", bytes(size))
+        self.bounding_box_y: array = array("b", bytes(size))
+        self.stride: int = width + 2
+        self.occupancy: int = 0
+        self.door: list = [0, 0, 0, 0]
+        border = 0
+        for y in range(height + 2):
+            for x in range(width + 2):
+                if x == 0 or y == 0 or x == width + 1 or y == height + 1:
+                    border |= 1 << (y * self.stride + x)
+        self.wall: list = [border, border, border, border]
+        # Per cell the wall types its neighbours show towards it, 2 bits per direction like the packed walls: facing >> (n << 1) & 0b11
+        # is the wall type of the neighbour in direction n on the side that touches the cell, 0 if that neighbour is empty.
+        # The map's edge counts as a wall. Together with the cell being empty this is all validate_room_position looks at
+        self.facing: bytearray = bytearray(size)
+        for y in range(height):
+            self.facing[y * width + width - 1] |= WALL
+            self.facing[y * width] |= WALL << 4
+        for x in range(width):
+            self.facing[x] |= WALL << 2
+            self.facing[(height - 1) * width + x] |= WALL << 6
+
+    # Returns the bitboard bit of the cell at index
+    def bit(self, index: int) -> int:
+        return 1 << ((index // self.width + 1) * self.stride + index % self.width + 1)
+
+    # Changes the walls of an occupied cell and keeps the bitboards up to date
+    def set_walls(self, index: int, packed_walls: int) -> None:
+        self._remove_from_bitboards(index)
+        self.walls[index] = packed_walls
+        self._add_to_bitboards(index)
+
+    # Writes the walls of the cell at index (EMPTY for none) into the facing bytes of its neighbours
+    def _update_facing(self, index: int, packed_walls: int) -> None:
+        if packed_walls == EMPTY:
+            packed_walls = 0
+        facing = self.facing
+        x = index % self.width
+        if x + 1 < self.width:
+            facing[index + 1] = (facing[index + 1] & 0b11001111) | ((packed_walls & 0b11) << 4)
+        if index >= self.width:
+            facing[index - self.width] = (facing[index - self.width] & 0b00111111) | (((packed_walls >> 2) & 0b11) << 6)
+        if x > 0:
+            facing[index - 1] = (facing[index - 1] & 0b11111100) | ((packed_walls >> 4) & 0b11)
+        if index + self.width < len(facing):
+            facing[index + self.width] = (facing[index + self.width] & 0b11110011) | (((packed_walls >> 6) & 0b11) << 2)
+
+    def _add_to_bitboards(self, index: int) -> None:
+        bit = self.bit(index)
+        packed_walls = self.walls[index]
+        self._update_facing(index, packed_walls)
+        self.occupancy |= bit
+        for direction in range(4):
+            wall_type = (packed_walls >> (direction << 1)) & 0b11
+            if wall_type == DOOR:
+                self.door[direction] |= bit
+            elif wall_type == WALL:
+                self.wall[direction] |= bit
+
+    def _remove_from_bitboards(self, index: int) -> None:
+        if self.walls[index] == EMPTY:
+            return
+        self._update_facing(index, EMPTY)
+        keep = ~self.bit(index)
+        self.occupancy &= keep
+        for direction in range(4):
+            self.door[direction] &= keep
+            self.wall[direction] &= keep
+
+    # Converts a coordinate tuple into an index into the arrays. Raises KeyError for positions outside of the grid like the dict did
+    def index(self, pos: tuple) -> int:
+        x, y = pos
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            raise KeyError(pos)
+        return y * self.width + x
+
+    def is_empty(self, pos: tuple) -> bool:
+        return self.walls[self.index(pos)] == EMPTY
+
+    # Writes a tile into the cell at index without creating a Tile object
+    def set_tile(self, index: int, r: int, u: int, l: int, d: int, room_id: int, layout_id: int, bounding_box_offset: tuple) -> None:
+        self._remove_from_bitboards(index)
+        self.walls[index] = pack_walls(r, u, l, d)
+        self._add_to_bitboards(index)
+        self.room_ids[index] = room_id
+        self.layout_ids[index] = layout_id
+        self.bounding_box_x[index] = bounding_box_offset[0]
+        self.bounding_box_y[index] = bounding_box_offset[1]
+
+    def clear_tile(self, index: int) -> None:
+        self._remove_from_bitboards(index)
+        self.walls[index] = EMPTY
+
+    def __getitem__(self, pos: tuple) -> TileView:
+        index = self.index(pos)
+        if self.walls[index] == EMPTY:
+            return None
+        return TileView(self, index)
+
+    def __setitem__(self, pos: tuple, tile) -> None:
+        index = self.index(pos)
+        if tile is None:
+            self.clear_tile(index)
+        else:
+            self.set_tile(index, tile.r, tile.u, tile.l, tile.d, tile.room_id, tile.layout_id, tile.bounding_box_offset)
+
+    def __contains__(self, pos: tuple) -> bool:
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+    def __len__(self) -> int:
+        return self.width * self.height
+
+    # Iterates over all coordinates in the same order as the old grid dict (row by row)
+    def __iter__(self):
+        return ((x, y) for y in range(self.height) for x in range(self.width))
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        return ((pos, self[pos]) for pos in self)
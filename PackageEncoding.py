@@ -0,0 +1,95 @@
+import struct
+
+# Compact binary form of the package that generate_package builds. decode_package(encode_package(package)) gives the same dict as
+# json.loads(json.dumps(package)).
+#
+# Layout, all integers little endian:
+#   header      PACKAGE_MAGIC, format version u8, width u8, height u8, number of rooms u16, transitions u32, items u16, BossData u16
+#   MapData     width * height cells of 3 bytes: walls, color, special. Walls holds the wall types u, r, d, l with 2 bits each,
+#               color 0 marks an empty cell ("0" in the JSON form)
+#   RoomData    per room: room id u16, x i16, y i16. EMPTY_ROOM as room id stands for an empty list
+#   Transitions per transition: layout id u16, x i8, y i8, direction u8, target layout id u16, target x i8, target y i8
+#   ItemData    per item: layout id u16, x i8, y i8, item id u16
+PACKAGE_MAGIC: bytes = b"AMPK"
+FORMAT_VERSION: int = 1
+EMPTY_ROOM: int = 0xFFFF
+HEADER: struct.Struct = struct.Struct("<4sBBBHIHH")
+ROOM: struct.Struct = struct.Struct("<Hhh")
+TRANSITION: struct.Struct = struct.Struct("<HbbBHbb")
+ITEM: struct.Struct = struct.Struct("<HbbH")
+
+# Cell strings of MapData and their 3 byte encoding, filled as they come up. A map only has a few hundred different cell strings
+_cell_bytes: dict = {"0": b"\x00\x00\x00"}
+_cell_strings: dict = {b"\x00\x00\x00": "0"}
+
+def encode_cell(cell: str) -> bytes:
+    encoded = _cell_bytes.get(cell)
+    if encoded is None:
+        # "urdl" wall types, color, special and a trailing 0
+        if len(cell) != 7 or cell[6] != "0" or not cell.isdigit():
+            raise ValueError(f"Can't encode map cell '{cell}'")
+        walls = int(cell[0]) | (int(cell[1]) << 2) | (int(cell[2]) << 4) | (int(cell[3]) << 6)
+        encoded = bytes([walls, int(cell[4]), int(cell[5])])
+        _cell_bytes[cell] = encoded
+        _cell_strings[encoded] = cell
+    return encoded
+
+def decode_cell(encoded: bytes) -> str:
+    cell = _cell_strings.get(encoded)
+    if cell is None:
+        walls = encoded[0]
+        cell = f"{walls & 0b11}{(walls >> 2) & 0b11}{(walls >> 4) & 0b11}{(walls >> 6) & 0b11}{encoded[1]}{encoded[2]}0"
+        _cell_strings[encoded] = cell
+    return cell
+
+def encode_package(package: dict) -> bytes:
+    map_data = package["MapData"]
+    width, height = map_data[0], map_data[1]
+    transitions = []
+    for outer_key, inner in package["TransitionData"].items():
+        layout_id = int(outer_key)
+        for inner_key, target in inner.items():
+            x, y, direction = inner_key.split("_")
+            transitions.append(TRANSITION.pack(layout_id, int(x), int(y), int(direction), target[0], target[1], target[2]))
+    items = []
+    for key, item_id in package["ItemData"].items():
+        layout_id, x, y = key.split("_")
+        items.append(ITEM.pack(int(layout_id), int(x), int(y), item_id))
+    rooms = [ROOM.pack(EMPTY_ROOM, 0, 0) if len(room) == 0 else ROOM.pack(room[0], room[1], room[2]) for room in package["RoomData"]]
+    header = HEADER.pack(PACKAGE_MAGIC, FORMAT_VERSION, width, height, len(rooms), len(transitions), len(items), package["BossData"])
+    cells = b"".join([encode_cell(cell) for cell in map_data[2:]])
+    return b"".join([header, cells, b"".join(rooms), b"".join(transitions), b"".join(items)])
+
+def decode_package(data: bytes) -> dict:
+    magic, version, width, height, room_count, transition_count, item_count, boss_data = HEADER.unpack_from(data, 0)
+    if magic != PACKAGE_MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"Not a package of format version {FORMAT_VERSION}")
+    offset = HEADER.size
+    map_data = [width, height]
+    map_data += [decode_cell(data[i:i+3]) for i in range(offset, offset + 3 * width * height, 3)]
+    offset += 3 * width * height
+
+    room_data = []
+    for room_id, x, y in ROOM.iter_unpack(data[offset:offset + ROOM.size * room_count]):
+        room_data.append([] if room_id == EMPTY_ROOM else [room_id, x, y])
+    offset += ROOM.size * room_count
+
+    transition_data = {}
+    for layout_id, x, y, direction, target_id, target_x, target_y in TRANSITION.iter_unpack(data[offset:offset + TRANSITION.size * transition_count]):
+        outer_key = str(layout_id)
+        if not outer_key in transition_data:
+            transition_data[outer_key] = {}
+        transition_data[outer_key][f"{x}_{y}_{direction}"] = [target_id, target_x, target_y]
+    offset += TRANSITION.size * transition_count
+
+    item_data = {}
+    for layout_id, x, y, item_id in ITEM.iter_unpack(data[offset:offset + ITEM.size * item_count]):
+        item_data[f"{layout_id}_{x}_{y}"] = item_id
+
+    return {
+        "RoomData": room_data,
+        "TransitionData": transition_data,
+        "MapData": map_data,
+        "ItemData": item_data,
+        "BossData": boss_data
+    }
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+
+# Results of placement checks of small rooms. Whether a room fits through one of its connections only depends on the cells
+# under the room being empty and on the walls the neighbouring cells show towards them (Grid.facing, which includes the map's
+# edges), as long as the room's bounding box is inside the map. So the result is stored under the connection and the facing
+# bytes of the cells under the room, and every later check at a place with the same neighbourhood gets it from here.
+# Every FloorGenerator has its own memo, so it only helps within one floor and starts empty again on every reroll.
+# Holds at most size entries, the least recently used one is evicted beyond that
+class PlacementMemo:
+    def __init__(self, size: int):
+        self.size: int = size
+        self.entries: OrderedDict = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    # Returns the stored result for key, or None
+    def get(self, key: tuple) -> bool:
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key: tuple, result: bool) -> None:
+        self.entries[key] = result
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
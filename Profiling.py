@@ -0,0 +1,107 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import signal
+import sys
+import time
+from collections import Counter
+
+# Profiler modes
+DETERMINISTIC: str = "cprofile" # Every call, exact counts, slows generation down a lot. Writes .pstats and a .txt summary
+SAMPLING: str = "sampling" # Stack samples on SIGPROF, low overhead. Writes .collapsed stacks for flamegraph.pl or speedscope
+MODES: tuple = (DETERMINISTIC, SAMPLING)
+SAMPLE_INTERVAL: float = 0.001 # Seconds of CPU time between two samples
+SUMMARY_LINES: int = 40 # Functions listed in the summary of a deterministic profile
+
+# Name of a frame in the collapsed stacks, e.g. BranchingGeneratorAsClass.py:FloorGenerator.validate_room_position
+def frame_name(frame) -> str:
+    code = frame.f_code
+    # co_qualname is new in Python 3.11, older versions only have the plain name
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+# Samples the call stack of the main thread every interval seconds of CPU time. Needs SIGPROF, which Windows doesn't have
+class SamplingProfiler:
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval: float = interval
+        # Number of samples per collapsed stack "outer;...;inner"
+        self.stacks: Counter = Counter()
+        self.root_frame = None
+        self.previous_handler = None
+
+    def sample(self, signum, frame) -> None:
+        names = []
+        while frame is not None and frame is not self.root_frame:
+            names.append(frame_name(frame))
+            frame = frame.f_back
+        self.stacks[";".join(reversed(names))] += 1
+
+    def start(self) -> None:
+        # Stacks stop at the frame that started the profiler
+        self.root_frame = sys._getframe(1)
+        self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self) -> None:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.previous_handler)
+        self.root_frame = None
+
+    def runcall(self, function, *args, **kwargs):
+        self.start()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.stop()
+
+    # Writes the samples in the collapsed stack format, one "stack count" line per stack
+    def write_collapsed(self, path: str) -> None:
+        with open(path, "w") as file:
+            for stack, count in sorted(self.stacks.items()):
+                file.write(f"{stack} {count}\n")
+
+# Returns the mode that can actually run here. Sampling falls back to the deterministic profiler without SIGPROF
+def available_mode(mode: str) -> str:
+    if not mode in MODES:
+        raise ValueError(f"Unknown profiler mode '{mode}'")
+    if mode == SAMPLING and not hasattr(signal, "SIGPROF"):
+        print("Sampling profiler needs SIGPROF, which this platform doesn't have. Using cProfile instead")
+        return DETERMINISTIC
+    return mode
+
+# Calls function(*args) under the profiler of the given mode and returns its result. The profile is written to output_base plus
+# the extension of the mode, metadata (seed and parameters of the generation) goes to output_base.json together with the mode,
+# the run time and the names of the profile files. The sampling profiler only works in the main thread
+def profile_call(mode: str, output_base: str, metadata: dict, function, *args, **kwargs):
+    mode = available_mode(mode)
+    directory = os.path.dirname(output_base)
+    if directory != "":
+        os.makedirs(directory, exist_ok=True)
+    files = []
+    start_time = time.perf_counter()
+    if mode == SAMPLING:
+        profiler = SamplingProfiler()
+        result = profiler.runcall(function, *args, **kwargs)
+        elapsed = time.perf_counter() - start_time
+        profiler.write_collapsed(output_base + ".collapsed")
+        files.append(output_base + ".collapsed")
+    else:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(function, *args, **kwargs)
+        elapsed = time.perf_counter() - start_time
+        profiler.dump_stats(output_base + ".pstats")
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(SUMMARY_LINES)
+        with open(output_base + ".txt", "w") as file:
+            file.write(summary.getvalue())
+        files += [output_base + ".pstats", output_base + ".txt"]
+
+    info = dict(metadata)
+    info["Profiler"] = mode
+    info["Seconds"] = elapsed
+    info["Files"] = [os.path.basename(f) for f in files]
+    with open(output_base + ".json", "w") as file:
+        json.dump(info, file, indent=2)
+    print(f"Wrote {mode} profile to {', '.join(files)}")
+    return result
@@ -0,0 +1,86 @@
+import asyncio
+import struct
+
+# Command types, the same in both protocols
+GENERATE_FLOOR: int = 1
+EXIT: int = 2
+# Framed protocol only: same as GENERATE_FLOOR, but the response body is the compact binary package of PackageEncoding.py
+GENERATE_FLOOR_COMPACT: int = 3
+# Framed protocol only: cancels the generate command with the same request id. That command is answered with STATUS_ERROR and
+# the body "cancelled", the cancel command itself gets no response
+CANCEL: int = 4
+
+# Legacy protocol: a command is its type byte and payload, terminated by '#'. The response to a generate command is the package
+# as raw JSON without length or request id, so only one command can be handled at a time
+LEGACY_TERMINATOR: bytes = b"#"
+
+# Framed protocol: every message starts with FRAME_MAGIC, a byte that is no legacy command type, followed by the length of the rest
+# of the frame as unsigned 32 bit little endian and the request id as unsigned 32 bit little endian.
+# Request frame:  FRAME_MAGIC | length | request id | command type (1 byte) | payload
+# Response frame: FRAME_MAGIC | length | request id | status (1 byte) | body
+# The payload of a generate command is the same as in the legacy protocol. The body of a response is the package as UTF-8 JSON,
+# or an error message if status is STATUS_ERROR. Responses can arrive in any order, the request id tells them apart
+FRAME_MAGIC: int = 0xAF
+FRAME_HEADER: struct.Struct = struct.Struct("<BII") # magic, length, request id
+STATUS_OK: int = 0
+STATUS_ERROR: int = 1
+# Smallest and largest length a request frame can have: request id and command type, and a generate command with a generous start inventory
+MIN_FRAME_LENGTH: int = 5
+MAX_FRAME_LENGTH: int = 0x10000
+
+# Raised by read_message for a frame that can't be read. The stream can't be trusted to be at the start of a message after it
+class ProtocolError(Exception):
+    def __init__(self, request_id: int, reason: str):
+        super().__init__(request_id, reason)
+        self.request_id: int = request_id
+        self.reason: str = reason
+
+    def __str__(self) -> str:
+        return self.reason
+
+# A command received from the server
+class Message:
+    __slots__ = ("framed", "request_id", "command_type", "payload")
+
+    def __init__(self, framed: bool, request_id: int, command_type: int, payload: bytes):
+        self.framed: bool = framed
+        self.request_id: int = request_id
+        self.command_type: int = command_type
+        self.payload: bytes = payload
+
+    # The raw bytes as they would have been sent with the legacy protocol, for printing
+    def legacy_bytes(self) -> bytes:
+        return bytes([self.command_type]) + self.payload + LEGACY_TERMINATOR
+
+# Reads the next command in whichever protocol the server used for it. Raises asyncio.IncompleteReadError if the server closed
+# and ProtocolError if a frame has a length no request can have
+async def read_message(reader: asyncio.StreamReader) -> Message:
+    first = await reader.readexactly(1)
+    if first[0] == FRAME_MAGIC:
+        length, request_id = struct.unpack("<II", await reader.readexactly(8))
+        if length < MIN_FRAME_LENGTH or length > MAX_FRAME_LENGTH:
+            raise ProtocolError(request_id, f"Invalid frame length {length}")
+        body = await reader.readexactly(length - 4)
+        return Message(True, request_id, body[0], body[1:])
+    command = first if first == LEGACY_TERMINATOR else first + await reader.readuntil(LEGACY_TERMINATOR)
+    return Message(False, None, command[0], command[1:-1])
+
+# Encodes a response frame
+def encode_response(request_id: int, status: int, body: bytes) -> bytes:
+    return FRAME_HEADER.pack(FRAME_MAGIC, 4 + 1 + len(body), request_id) + bytes([status]) + body
+
+# Encodes a request frame, the way the server sends them
+def encode_request(request_id: int, command_type: int, payload: bytes = b"") -> bytes:
+    return FRAME_HEADER.pack(FRAME_MAGIC, 4 + 1 + len(payload), request_id) + bytes([command_type]) + payload
+
+# Returns (width, height, number_of_keys, start_inventory) of a generate command's payload. The start inventory is a list of
+# unsigned 16 bit little endian item ids
+def parse_generate_payload(payload: bytes) -> tuple:
+    if len(payload) < 3:
+        raise ValueError(f"Generate command needs at least 3 bytes of payload, got {len(payload)}")
+    start_inventory = [payload[i] | (payload[i+1] << 8) for i in range(3, len(payload) - 1, 2)]
+    return payload[0], payload[1], payload[2], start_inventory
+
+# Builds the payload of a generate command
+def encode_generate_payload(width: int, height: int, number_of_keys: int, start_inventory: list) -> bytes:
+    return bytes([width, height, number_of_keys]) + b"".join(struct.pack("<H", item) for item in start_inventory)
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import math
+import os
+import pickle
+
+# Bump whenever the layout of the compiled data changes so old cache files get rebuilt
+ROOM_SET_FORMAT_VERSION: int = 6
+# Compiled room sets are stored next to their source file in this directory
+COMPILED_DIRECTORY: str = "__compiled__"
+COMPILED_EXTENSION: str = ".roomset"
+
+# Door directions and wall types, same values as in the generator
+RIGHT: int = 0
+UP: int = 1
+LEFT: int = 2
+DOWN: int = 3
+WALL: int = 1
+DOOR: int = 2
+# Wall types the neighbours of a cell show towards it, 2 bits per direction like Grid.facing
+NEIGHBOURHOOD_PATTERNS: int = 256
+# Position change of a step in every direction
+DIRECTION_STEPS: tuple = ((1, 0), (0, -1), (-1, 0), (0, 1))
+
+# Room sets that were already loaded in this process, keyed by (absolute path, mtime, size) of the source file
+_loaded_room_sets: dict = {}
+
+# A door of a room that another room can connect to, together with everything needed to place the room through it.
+# offsets are the positions of the room's tiles relative to the door tile, the anchor values describe which door positions
+# keep the room's bounding box inside a map. exits holds (x, y, direction) of the cells outside the room that its doors lead to,
+# relative to the door tile, with direction being the door's
+class RoomConnection:
+    __slots__ = ("room", "direction", "entry", "offsets", "anchor_min_x", "anchor_min_y", "anchor_margin_x", "anchor_margin_y", "exits")
+
+    def __init__(self, room, direction: int, entry: tuple):
+        bounding_box = room.bounding_box
+        self.room = room
+        self.direction = direction
+        self.entry = entry
+        self.offsets = tuple((tile[0] - entry[0], tile[1] - entry[1]) for tile in room.tiles)
+        # The door tile has to be at least this far from the top-left edge of the map...
+        self.anchor_min_x = entry[0] - bounding_box[0]
+        self.anchor_min_y = entry[1] - bounding_box[1]
+        # ...and this far from the bottom-right edge
+        self.anchor_margin_x = bounding_box[0] + bounding_box[2] - entry[0]
+        self.anchor_margin_y = bounding_box[1] + bounding_box[3] - entry[1]
+        exits = []
+        for offset, walls in zip(self.offsets, room.walls):
+            for door_direction, step in enumerate(DIRECTION_STEPS):
+                target = (offset[0] + step[0], offset[1] + step[1])
+                if walls[door_direction] == DOOR and not target in self.offsets:
+                    exits.append((target[0], target[1], door_direction))
+        self.exits = tuple(exits)
+
+    # Returns the inclusive range (min_x, min_y, max_x, max_y) of global door positions that keep the room inside the map
+    def anchor_range(self, width: int, height: int) -> tuple:
+        return (self.anchor_min_x, self.anchor_min_y, width - 1 - self.anchor_margin_x, height - 1 - self.anchor_margin_y)
+
+# Room definition with the layout parsed into integer data. Tiles keep the order of the json layout.
+# walls holds (r, u, l, d) per tile, door_masks holds a 4 bit mask per tile with bit n set if the tile has a door in direction n.
+# masks caches the room's bitboards per grid stride, it is filled in by Grid.room_masks.
+# weight_curve holds the room's weight for every depth up to the depth where Scaling Min and Scaling Max stop changing it
+class CompiledRoom:
+    __slots__ = ("index", "room_id", "tiles", "walls", "door_masks", "can_have_item", "item_locks", "bounding_box",
+                 "bounding_box_offsets", "door_tiles", "door_directions", "connections", "lock", "weight", "scaling",
+                 "scaling_min", "scaling_max", "is_dead_end", "masks", "weight_curve")
+
+    def __init__(self, index: int, room: dict):
+        layout: dict = room["Layout"]
+        self.index = index
+        self.room_id = room["RoomID"]
+        self.tiles = tuple(tuple(map(int, key.split(","))) for key in layout)
+        self.walls = tuple(tuple(layout[key][:4]) for key in layout)
+        self.door_masks = tuple(sum(1 << d for d in range(4) if walls[d] == DOOR) for walls in self.walls)
+        self.can_have_item = tuple(bool(layout[key][4]) for key in layout)
+        self.item_locks = tuple(tuple(layout[key][5]) for key in layout)
+        self.bounding_box = tuple(room["BoundingBox"])
+        self.bounding_box_offsets = tuple((tile[0] - self.bounding_box[0], tile[1] - self.bounding_box[1]) for tile in self.tiles)
+        self.door_tiles = tuple(tuple(tuple(map(int, key.split(","))) for key in door_list) for door_list in room["DoorTiles"])
+        self.door_directions = sum(1 for door_list in self.door_tiles if len(door_list) > 0)
+        self.connections = tuple(tuple(RoomConnection(self, direction, entry) for entry in self.door_tiles[direction]) for direction in range(4))
+        self.lock = tuple(room["Lock"])
+        self.weight = room["Weight"]
+        self.scaling = room["Scaling"]
+        self.scaling_min = room["Scaling Min"]
+        self.scaling_max = room["Scaling Max"]
+        self.is_dead_end = room["IsDeadEnd"]
+        self.masks = {}
+        self.weight_curve = tuple(self.weight_at_uncached(depth) for depth in range(max(self.scaling_min, self.scaling_max, 0) + 1))
+
+    # Calculates the weight of the room, scaling with distance (in rooms) to the start location
+    def weight_at_uncached(self, depth: int) -> float:
+        if depth < self.scaling_min:
+            scale_amount = 0.0
+        elif depth < self.scaling_max or self.scaling_max == -1:
+            scale_amount = depth
+        else:
+            scale_amount = self.scaling_max
+        return self.weight + self.scaling * scale_amount
+
+    # Same as weight_at_uncached, but looks the weight up in the weight curve when possible. Past the end of the curve the weight is
+    # either clamped at Scaling Max or keeps growing linearly if there is no maximum
+    def weight_at(self, depth: int) -> float:
+        if depth < len(self.weight_curve):
+            return self.weight_curve[depth]
+        if self.scaling_max != -1:
+            return self.weight_curve[-1]
+        return self.weight + self.scaling * depth
+
+# Container for the compiled data of a room set file. The direction lists hold the rooms themselves instead of indices.
+# Everything in here is shared between all generators of a process and must not be mutated
+class RoomSet:
+    def __init__(self, source_hash: str, room_data: list, right_door_rooms: list, up_door_rooms: list, left_door_rooms: list, down_door_rooms: list):
+        self.source_hash = source_hash
+        self.room_data = room_data
+        self.right_door_rooms = right_door_rooms
+        self.up_door_rooms = up_door_rooms
+        self.left_door_rooms = left_door_rooms
+        self.down_door_rooms = down_door_rooms
+        self.depth_breakpoints = depth_breakpoints(room_data)
+        self.closures = closure_table(room_data)
+
+# Returns the sorted depths at which the weight of any room can change between zero and non-zero.
+# Between two neighbouring breakpoints every room is either always or never placeable, which makes the index of a depth
+# in this list (see bisect) a valid cache key for the set of placeable rooms
+def depth_breakpoints(rooms: tuple) -> tuple:
+    breakpoints = {0, 1}
+    for room in rooms:
+        breakpoints.add(room.scaling_min)
+        if room.scaling_max != -1:
+            breakpoints.add(room.scaling_max)
+        # Depth where weight + scaling * depth crosses zero
+        if room.scaling != 0:
+            crossing = -room.weight / room.scaling
+            if crossing > 0:
+                breakpoints.add(math.floor(crossing))
+                breakpoints.add(math.floor(crossing) + 1)
+    return tuple(sorted(b for b in breakpoints if b >= 0))
+
+# Returns True if a tile with walls (r, u, l, d) can go into an empty cell whose neighbours show the wall types of pattern towards it,
+# which is what validate_room_position checks: no door of the tile leads into a wall and no wall of the tile blocks a neighbour's door
+def tile_fits_pattern(walls: tuple, pattern: int) -> bool:
+    for direction in range(4):
+        facing = (pattern >> (direction << 1)) & 0b11
+        if (walls[direction] == DOOR and facing == WALL) or (walls[direction] == WALL and facing == DOOR):
+            return False
+    return True
+
+# Returns the dead ends that can close an open connection, indexed by the door direction the connection needs and the pattern of its
+# target cell (Grid.facing). Entries are (room, connections) in room set order. Whether a single tile dead end fits only depends on
+# the pattern, so those are listed only where they fit, with the connections to place them through. Larger dead ends also depend on
+# the cells around the target and are listed with connections None wherever the tile with their door fits the pattern
+def closure_table(rooms: tuple) -> tuple:
+    table = []
+    for door_dir in range(4):
+        ends = [room for room in rooms if room.is_dead_end and len(room.door_tiles[door_dir]) > 0]
+        by_pattern = []
+        for pattern in range(NEIGHBOURHOOD_PATTERNS):
+            closures = []
+            for room in ends:
+                connections = tuple(c for c in room.connections[door_dir] if tile_fits_pattern(room.walls[room.tiles.index(c.entry)], pattern))
+                if len(connections) > 0:
+                    closures.append((room, connections if len(room.tiles) == 1 else None))
+            by_pattern.append(tuple(closures))
+        table.append(tuple(by_pattern))
+    return tuple(table)
+
+# Returns (door direction, pattern, closures) for every neighbourhood an open connection can have, in direction and pattern order.
+# The neighbour the connection comes from shows a door, every other one a wall, a door or nothing. closures is the entry of the
+# closure table, an empty tuple means a dead end can never close that connection
+def connection_patterns(closures: tuple) -> list:
+    patterns = []
+    for door_dir in range(4):
+        for pattern in range(NEIGHBOURHOOD_PATTERNS):
+            wall_types = [(pattern >> (direction << 1)) & 0b11 for direction in range(4)]
+            if wall_types[door_dir] == DOOR and max(wall_types) <= DOOR:
+                patterns.append((door_dir, pattern, closures[door_dir][pattern]))
+    return patterns
+
+# Returns the sha256 hex digest of the raw bytes of a room set file
+def hash_source(source_bytes: bytes) -> str:
+    return hashlib.sha256(source_bytes).hexdigest()
+
+# Turns the parsed json dict of a room set into a RoomSet
+def compile_room_set(full_dict: dict, source_hash: str) -> RoomSet:
+    rooms = tuple(CompiledRoom(i, room) for i, room in enumerate(full_dict["AllRooms"]))
+    return RoomSet(
+        source_hash,
+        rooms,
+        tuple(rooms[i] for i in full_dict["RightDoorRooms"]),
+        tuple(rooms[i] for i in full_dict["UpDoorRooms"]),
+        tuple(rooms[i] for i in full_dict["LeftDoorRooms"]),
+        tuple(rooms[i] for i in full_dict["DownDoorRooms"])
+    )
+
+# Returns the path of the compiled file belonging to a room set source file with the given content hash
+def compiled_path(source_path: str, source_hash: str) -> str:
+    directory, file_name = os.path.split(os.path.abspath(source_path))
+    base_name = os.path.splitext(file_name)[0]
+    return os.path.join(directory, COMPILED_DIRECTORY, f"{base_name}.{source_hash[:16]}{COMPILED_EXTENSION}")
+
+# Reads a compiled room set. Returns None if the file is missing, unreadable or was written for another source or format version
+def read_compiled(path: str, source_hash: str) -> RoomSet:
+    try:
+        with open(path, "rb") as file:
+            format_version, stored_hash, room_set = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, TypeError):
+        return None
+    if format_version != ROOM_SET_FORMAT_VERSION or stored_hash != source_hash:
+        return None
+    return room_set
+
+# Writes a compiled room set and removes stale compiled versions of the same source file.
+# Failing to write the cache is not an error, the room set will simply be compiled again next time
+def write_compiled(path: str, room_set: RoomSet) -> None:
+    directory, file_name = os.path.split(path)
+    prefix = file_name.split(".")[0] + "."
+    try:
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump((ROOM_SET_FORMAT_VERSION, room_set.source_hash, room_set), file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        for other in os.listdir(directory):
+            if other != file_name and other.startswith(prefix) and other.endswith(COMPILED_EXTENSION):
+                os.remove(os.path.join(directory, other))
+    except OSError:
+        pass
+
+# Loads a room set from a json file without using or updating the compiled cache
+def load_room_set_json(source_path: str) -> RoomSet:
+    with open(source_path, "rb") as file:
+        source_bytes = file.read()
+    return compile_room_set(json.loads(source_bytes), hash_source(source_bytes))
+
+# Loads a room set, using the compiled cache if it matches the content of the source file and rebuilding it otherwise.
+# Every room set is only loaded once per process unless its source file changes. Raises FileNotFoundError if the source is missing
+def load_room_set(source_path: str) -> RoomSet:
+    stat = os.stat(source_path)
+    process_key = (os.path.abspath(source_path), stat.st_mtime_ns, stat.st_size)
+    if process_key in _loaded_room_sets:
+        return _loaded_room_sets[process_key]
+
+    with open(source_path, "rb") as file:
+        source_bytes = file.read()
+    source_hash = hash_source(source_bytes)
+    cache_path = compiled_path(source_path, source_hash)
+    room_set = read_compiled(cache_path, source_hash)
+    if room_set is None:
+        room_set = compile_room_set(json.loads(source_bytes), source_hash)
+        write_compiled(cache_path, room_set)
+
+    _loaded_room_sets[process_key] = room_set
+    return room_set
@@ -0,0 +1,75 @@
+# Weighted random selection over a fixed list of items using a Fenwick tree (binary indexed tree) of the weights.
+# Drawing an item and removing it from the selection both cost O(log n)
+class WeightTable:
+    __slots__ = ("items", "weights", "tree", "total", "remaining", "top_step")
+
+    def __init__(self, items: list, weights: list):
+        self.items = items
+        self.weights = list(weights)
+        n = len(self.weights)
+        # tree[i] (1-based) holds the sum of the weights in (i - lowbit(i), i]
+        tree = [0.0] + self.weights
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.total = sum(self.weights)
+        self.remaining = sum(1 for w in self.weights if w > 0)
+        self.top_step = 1 << (n.bit_length() - 1) if n > 0 else 0
+
+    # Returns a copy that can be drawn from and removed from without changing this table
+    def copy(self):
+        table = WeightTable.__new__(WeightTable)
+        table.items = self.items
+        table.weights = self.weights[:]
+        table.tree = self.tree[:]
+        table.total = self.total
+        table.remaining = self.remaining
+        table.top_step = self.top_step
+        return table
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    # Returns the index of the item a value in [0, total] falls on when the weights are laid out one after another,
+    # or -1 if all items were removed
+    def find(self, value: float) -> int:
+        if self.remaining == 0:
+            return -1
+        position = 0
+        step = self.top_step
+        n = len(self.weights)
+        while step > 0:
+            if position + step <= n and self.tree[position + step] < value:
+                position += step
+                value -= self.tree[position]
+            step >>= 1
+        # Rounding can make the search land on a removed item or behind the last item, use the closest remaining item instead
+        if position >= n or self.weights[position] <= 0:
+            remaining = [i for i in range(n) if self.weights[i] > 0]
+            if len(remaining) == 0:
+                return -1
+            position = min(remaining, key=lambda i: abs(i - position))
+        return position
+
+    # Draws the index of an item with a probability proportional to its weight, using the given uniform(a, b) function
+    def draw(self, uniform) -> int:
+        return self.find(uniform(0, self.total))
+
+    # Removes the item at index from the selection
+    def remove(self, index: int) -> None:
+        weight = self.weights[index]
+        if weight <= 0:
+            return
+        self.weights[index] = 0.0
+        self.total -= weight
+        i = index + 1
+        n = len(self.weights)
+        while i <= n:
+            self.tree[i] -= weight
+            i += i & -i
+        self.remaining -= 1
+        # Don't let rounding errors leave a positive total behind once everything was removed
+        if self.remaining == 0:
+            self.total = 0.0